@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
-from datetime import timedelta
-from backend.streamlit_utils.data_loader import get_portfolio_performance_daily
-from backend.streamlit_utils.constants import METRIC_HELP_TEXTS
+from backend.streamlit_utils.data_loader import get_portfolio_snapshot, get_portfolio_metadata
+from backend.streamlit_utils.constants import METRIC_HELP_TEXTS, DATE_FORMAT_ISO
 
 # Set the page title
 st.set_page_config(page_title="Portfolio Analysis", page_icon="📊", layout="wide")
@@ -27,23 +26,14 @@ rename_dict = {
     'net_performance_percentage': 'Net Performance (%)'
 }
 
-# Load portfolio data
-df = get_portfolio_performance_daily()
-if not df.empty:
-    # Rename columns
-    df = df.rename(columns=rename_dict)
-
-    df = df.sort_values(by='End Date', ascending=True)
-
-    # Remove 'Full Portfolio' entry
-    df = df[df["Product"] != "Full portfolio"]
-
+# Load filter metadata; the snapshot itself is computed by the API
+metadata = get_portfolio_metadata()
+if metadata.get("products") and metadata.get("max_date"):
     # Set the default date to most recent end date
-    default_selected_date = df['End Date'].max()
+    default_selected_date = metadata["max_date"]
     
     # Date selection
-    selected_date_input = st.date_input("Select End Date", default_selected_date, min_value=df["End Date"].min(), max_value=df["End Date"].max(), width=250)
-    selected_date = pd.to_datetime(selected_date_input)
+    selected_date_input = st.date_input("Select End Date", default_selected_date, min_value=metadata["min_date"], max_value=metadata["max_date"], width=250)
     
     holdings_option = st.segmented_control(
         "Holdings to include",
@@ -53,20 +43,15 @@ if not df.empty:
         help="Current Holdings only include products with a non-zero current value"
     )
 
-    filtered_df = df[df['End Date'] <= selected_date]
-    if filtered_df.empty:
+    # Products on the last day with data up to the selected date, with the totals of that day and the day before
+    snapshot = get_portfolio_snapshot(as_of=selected_date_input.strftime(DATE_FORMAT_ISO), trend_days=30)
+    if not snapshot["products"]:
         st.error("No data found for the selected date. Please select a different date.")
         st.stop()
-    
-    # Get recent two distinct dates
-    filtered_dates = filtered_df['End Date'].unique()[-2:]
-    filtered_dates = sorted(filtered_dates)
-    date_0 = filtered_dates[0]
-    date_1 = filtered_dates[1] if len(filtered_dates) > 1 else date_0
 
     # Top net return
-    top_net_return_start = filtered_df[filtered_df['End Date'] == date_0].get('Net Return (€)', 0).sum()
-    top_net_return_end = filtered_df[filtered_df['End Date'] == date_1].get('Net Return (€)', 0).sum()
+    top_net_return_start = snapshot["previous_totals"]["net_return"] or 0
+    top_net_return_end = snapshot["totals"]["net_return"] or 0
 
     if top_net_return_start != 0:
         top_net_return_delta = round((top_net_return_end-top_net_return_start), 2)
@@ -77,8 +62,8 @@ if not df.empty:
         top_net_return_delta_per = 0
 
     # Top current value
-    top_current_value_start = filtered_df[filtered_df['End Date'] == date_0].get('Current Value (€)', 0).sum()
-    top_current_value_end = filtered_df[filtered_df['End Date'] == date_1].get('Current Value (€)', 0).sum()
+    top_current_value_start = snapshot["previous_totals"]["current_value"] or 0
+    top_current_value_end = snapshot["totals"]["current_value"] or 0
 
     if top_current_value_start != 0:
         top_current_value_delta = round((top_current_value_end-top_current_value_start), 2)
@@ -92,12 +77,12 @@ if not df.empty:
     today_pl = top_net_return_delta
     today_pl_per = top_net_return_delta_per
 
-    # Filter the DataFrame for the recent selected date
-    selected_day_df = df[df['End Date'] == date_1]
+    # Products on the selected date, with their 30-day Net Performance (%) trend as list
+    selected_day_df = pd.DataFrame(snapshot["products"]).rename(columns={**rename_dict, "trend": "Net Performance (%) - Trend"})
 
     # Total profit/loss
-    total_pl = selected_day_df['Net Return (€)'].sum()
-    total_pl_per = selected_day_df['Net Return (€)'].sum() / selected_day_df['Total Cost (€)'].sum() * 100 if selected_day_df['Total Cost (€)'].sum() != 0 else 0
+    total_pl = snapshot["totals"]["net_return"] or 0
+    total_pl_per = total_pl / snapshot["totals"]["total_cost"] * 100 if snapshot["totals"]["total_cost"] else 0
     
     # Filter based on holdings option
     if holdings_option == "Current Holdings":
@@ -108,20 +93,9 @@ if not df.empty:
 
     # Only select relevant columns
     display_df = display_df[['Product', 'Quantity', 'Current Value (€)', 'Cost Basis (€)',
-                                'Net Return (€)', 'Net Performance (%)', 'Total Cost (€)'
+                                'Net Return (€)', 'Net Performance (%)', 'Net Performance (%) - Trend', 'Total Cost (€)'
                     ]]
 
-    # Create new column with 30-day Net Performance (%) trend as list
-    date_L30 = date_1 - timedelta(days=30)
-    display_df["Net Performance (%) - Trend"] = display_df.apply(
-        lambda row: df[
-            (df["Product"] == row["Product"]) &
-            (df["End Date"] >= date_L30) &
-            (df["End Date"] <= date_1)
-        ]["Net Performance (%)"].tolist(),
-        axis=1
-    )
-
     # Allocation
     display_df["Current Allocation %"] = display_df['Current Value (€)'] / display_df['Current Value (€)'].sum() * 100
 
@@ -7,6 +7,7 @@ import requests
 import time
 from backend.streamlit_utils.logs import get_log_files, read_last_n_lines_reversed
 from backend.streamlit_utils.data_loader import get_portfolio_performance_daily, get_portfolio_metadata
+from backend.services.downsampling import downsample_frame
 from backend.streamlit_utils.api import (
     trigger_portfolio_calculation,
     trigger_db_sync,
@@ -23,6 +24,7 @@ from backend.streamlit_utils.constants import (
     DEGIRO_TRANSACTIONS_IMG,
     PERFORMANCE_METRIC_RENAME,
     DATE_RANGE_OPTIONS,
+    CHART_MAX_POINTS,
     METRIC_HELP_TEXTS
 )
 
@@ -504,11 +506,19 @@ if not filtered_df.empty:
     has_buys = False
     has_sells = False
 
+    # Metrics of the plotted lines
+    line_metrics = [selected_metric] + (["Cost Basis (€)"] if cost_basis_needed else [])
+
     for df, product_name, line_color in products_to_plot:
+        # Long ranges: plot a downsampled series of the loaded rows instead of every daily row
+        line_df = df
+        if len(df) > CHART_MAX_POINTS:
+            line_df = downsample_frame(df, CHART_MAX_POINTS * len(line_metrics), line_metrics, 'End Date')
+
         # Add main line
         fig.add_scatter(
-            x=df['End Date'],
-            y=df[selected_metric],
+            x=line_df['End Date'],
+            y=line_df[selected_metric],
             mode='lines',
             name=product_name,
             line=dict(color=line_color, shape='spline', smoothing=0.7)
@@ -517,8 +527,8 @@ if not filtered_df.empty:
         # Add Cost Basis line if checkbox is checked (only for Current Value (€))
         if cost_basis_needed:
             fig.add_scatter(
-                x=df["End Date"],
-                y=df["Cost Basis (€)"],
+                x=line_df["End Date"],
+                y=line_df["Cost Basis (€)"],
                 mode="lines",
                 name="Cost Basis (€)",
                 showlegend=False,
@@ -3,7 +3,7 @@ import pandas as pd
 import os
 import yfinance as yf
 from backend.streamlit_utils.api import post_api_request
-from backend.streamlit_utils.data_loader import get_portfolio_performance_daily
+from backend.streamlit_utils.data_loader import get_portfolio_snapshot
 from backend.streamlit_utils.constants import (
     API_BASE_URL,
     ENV_API_BASE_URL_KEY,
@@ -54,20 +54,13 @@ def get_current_stock_price(ticker_symbol):
     else:
         return None
 
-# Load portfolio data
-df = get_portfolio_performance_daily()
-if not df.empty:
-    # Load daily data
-    daily_df = df
-    daily_df = daily_df.rename(columns=PERFORMANCE_METRIC_RENAME)
-
-    # Get the most recent data
-    daily_df_recent_date = sorted(daily_df['End Date'].unique())[-1]
+# Load the most recent products snapshot (without the Full portfolio)
+snapshot = get_portfolio_snapshot()
+if snapshot["products"]:
+    daily_df_filtered = pd.DataFrame(snapshot["products"]).rename(columns=PERFORMANCE_METRIC_RENAME)
 
     # Filter dataframe
-    daily_df_filtered = daily_df[daily_df['End Date'] == daily_df_recent_date]
     daily_df_filtered = daily_df_filtered[daily_df_filtered['Quantity'] > 0]
-    daily_df_filtered = daily_df_filtered[daily_df_filtered['Product'] != 'Full portfolio']
 
     # Input for the amount to invest
     to_invest = st.number_input('Amount to invest', value=350, step=10)
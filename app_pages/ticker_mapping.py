@@ -9,6 +9,7 @@ from backend.streamlit_utils.constants import (
     ENV_API_BASE_URL_KEY
 )
 from backend.streamlit_utils.api import delete_data
+from backend.utils.isin_mapping import MAPPING_FILE, mapping_exists, get_isin_mapping, save_isin_mapping, delete_isin_mapping
 from backend.streamlit_utils.data_loader import get_portfolio_performance_daily, get_portfolio_metadata
 
 # Set the page title
@@ -28,13 +29,12 @@ except Exception as e:
     st.stop()
 
 # Paths
-mapping_path = os.path.join('output', 'isin_mapping.json')
+mapping_path = MAPPING_FILE
 
 # Load or initialize mapping
 if 'df' not in st.session_state:
-    if os.path.exists(mapping_path):
-        with open(mapping_path, 'r') as f:
-            mapping = json.load(f)
+    if mapping_exists():
+        mapping = get_isin_mapping()
 
         # Flatten the nested dictionary into a DataFrame
         st.session_state.df = pd.DataFrame([
@@ -98,8 +98,7 @@ def save_mapping(df):
         for _, row in st.session_state.df.iterrows()
     }
 
-    with open(mapping_path, 'w') as f:
-        json.dump(updated_mapping, f, indent=4)
+    save_isin_mapping(updated_mapping)
 
     st.success("Mapping saved successfully!")
 
@@ -205,8 +204,7 @@ with st.expander("Upload/download mapping JSON file", expanded=False):
                 ])
 
                 # Save uploaded mapping to file to overwrite existing one
-                with open(mapping_path, 'w') as f:
-                    json.dump(new_mapping, f, indent=4)
+                save_isin_mapping(new_mapping)
 
                 st.success("Mapping file uploaded and loaded successfully!")
                 # Force initial load after mapping change by deleting existing data
@@ -237,8 +235,7 @@ with st.expander("⚠️ Reset all tickers and display names (this cannot be und
     if st.button("Reset", type="primary"):
         # Delete mapping json
         try:
-            file_path = "output/isin_mapping.json"
-            os.remove(file_path)
+            delete_isin_mapping()
             st.success("All tickers and display names have been reset.")
         except:
             st.error("Failed to reset mappings.")
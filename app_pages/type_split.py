@@ -2,51 +2,29 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import plotly.express as px
-import os
-import json
-from backend.streamlit_utils.data_loader import get_portfolio_performance_daily
-from backend.streamlit_utils.constants import PERFORMANCE_METRIC_RENAME, METRIC_HELP_TEXTS
+from backend.utils.isin_mapping import mapping_exists
+from backend.streamlit_utils.data_loader import get_type_split, get_portfolio_metadata
+from backend.streamlit_utils.constants import PERFORMANCE_METRIC_RENAME, METRIC_HELP_TEXTS, DATE_FORMAT_ISO, CHART_MAX_POINTS
+from backend.services.downsampling import downsample_frame
 
 # Set the page title
 st.set_page_config(page_title="Portfolio Analysis - Split", page_icon="📊", layout="centered")
 
 st.title("Portfolio Analysis - Split")
 
-# Load portfolio data
-mapping_path = os.path.join('output', 'isin_mapping.json')
+# Load filter metadata; the split itself is aggregated by the API
+metadata = get_portfolio_metadata()
+if metadata.get("products") and metadata.get("max_date"):
 
-# Load portfolio data
-df = get_portfolio_performance_daily()
-if not df.empty:
-    # Rename columns
-    df = df.rename(columns=PERFORMANCE_METRIC_RENAME)
-
-    df = df.sort_values(by='End Date', ascending=True)
-
-    # Remove 'Full Portfolio' entry
-    df = df[df["Product"] != "Full portfolio"]
-
-    # Load or initialize mapping
-    if os.path.exists(mapping_path):
-        with open(mapping_path, 'r') as f:
-            mapping = json.load(f)
-
-        # Flatten the nested dictionary into a DataFrame
-        mapping_df = pd.DataFrame([
-            {"ISIN": isin, "Ticker": data.get("ticker", ""), "Exchange": data.get("exchange", ""), "Product Name (DeGiro)": data.get("degiro_name", ""), "Display Name": data.get("display_name", ""), "Product Type": data.get("product_type", "")}
-            for isin, data in mapping.items()
-            ])
-    else:
+    # Product types come from the mapping
+    if not mapping_exists():
         st.error("Mapping not found. Make sure to run the 'dashboard' page first to generate the mapping file.")
         st.stop()
 
-    # Join product type form mapping_df to selected_day_df
-    merged_df = df.merge(mapping_df[['Ticker', 'Product Type']], left_on='Ticker', right_on='Ticker', how='left')
-
     # DATE  FILTER    
     # Set the full date range as min and max values for the slider
-    max_date = df['End Date'].max()
-    min_date = df['End Date'].min()
+    max_date = metadata["max_date"]
+    min_date = metadata["min_date"]
 
     # Date selection
     date_selection = st.segmented_control(
@@ -90,28 +68,24 @@ if not df.empty:
     selected_start_date = max_date - timedelta(days=date_mapping[date_selection][0])
     selected_end_date = max_date - timedelta(days=date_mapping[date_selection][1])
 
-    # Filter data by date range
-    filtered_df = merged_df[(merged_df['End Date'] >= selected_start_date) & (merged_df['End Date'] <= selected_end_date)].sort_values(by='End Date')
-
     # METRIC FILTER
     non_metric_cols = ['Product', 'Ticker', 'Start Date', 'End Date']
     performance_metrics = sorted([v for k, v in PERFORMANCE_METRIC_RENAME.items() if v not in non_metric_cols])
     default_index_per = performance_metrics.index("Net Performance (%)") if "Net Performance (%)" in performance_metrics else 0
     selected_metric = st.selectbox("Select a Performance Metric", options=performance_metrics, index=default_index_per, key="metric_select")
-    
-    # Group by Product Type and aggregate € metrics
-    euro_cols = [col for col in filtered_df.columns if "€" in col]
-    split_df = (
-        filtered_df
-            .groupby(["End Date", "Product Type"])[euro_cols]
-            .sum()
-            .reset_index()
-            .sort_values(by=["End Date", "Product Type"], ascending=False)
+
+    # Daily metric per product type in the date range (Cost Basis for the cost basis line and markers)
+    metric_columns = {v: k for k, v in PERFORMANCE_METRIC_RENAME.items()}
+    split_df = get_type_split(
+        start_date=selected_start_date.strftime(DATE_FORMAT_ISO),
+        end_date=selected_end_date.strftime(DATE_FORMAT_ISO),
+        metrics=list(dict.fromkeys([metric_columns[selected_metric], "cost_basis"])),
     )
+    if split_df.empty:
+        st.info("No product type data found for the selected date range.")
+        st.stop()
 
-    # Add metrics after grouping
-    split_df["Net Performance (%)"] = (split_df["Net Return (€)"] / split_df["Total Cost (€)"]) * 100 if split_df["Total Cost (€)"].any() else 0
-    split_df["Current Performance (%)"] = (split_df["Current Return (€)"] / split_df["Cost Basis (€)"]) * 100 if split_df["Cost Basis (€)"].any() else 0
+    split_df = split_df.rename(columns={**PERFORMANCE_METRIC_RENAME, "product_type": "Product Type"})
 
     # Round columns to 2 decimal places
     round_cols = [col for col in split_df.columns if "€" in col or "%" in col]
@@ -162,13 +136,21 @@ if not df.empty:
     has_buys = False
     has_sells = False
 
+    # Metrics of the plotted lines
+    line_metrics = [selected_metric] + (["Cost Basis (€)"] if cost_basis_needed else [])
+
     # Loop over each product type and add a line
     for product_type in split_df["Product Type"].unique():
         product_data = split_df[split_df["Product Type"] == product_type].sort_values(by="End Date")
 
+        # Long ranges: plot a downsampled series instead of every daily row
+        line_data = product_data
+        if len(product_data) > CHART_MAX_POINTS:
+            line_data = downsample_frame(product_data, CHART_MAX_POINTS * len(line_metrics), line_metrics, "End Date")
+
         fig.add_scatter(
-            x=product_data["End Date"],
-            y=product_data[selected_metric],
+            x=line_data["End Date"],
+            y=line_data[selected_metric],
             mode="lines",
             name=product_type,
             line=dict(shape='spline', smoothing=0.7,
@@ -178,8 +160,8 @@ if not df.empty:
         # Add Cost Basis line if checkbox is checked (only for Current Value (€))
         if cost_basis_needed:
             fig.add_scatter(
-                x=product_data["End Date"],
-                y=product_data["Cost Basis (€)"],
+                x=line_data["End Date"],
+                y=line_data["Cost Basis (€)"],
                 mode="lines",
                 name="Cost Basis (€)",
                 showlegend=False,
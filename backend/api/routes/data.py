@@ -1,59 +1,169 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import List, Optional
 from datetime import date
-from backend.utils.db import get_db
-from backend.models.portfolio_daily import PortfolioPerformanceDailyTable, PortfolioPerformanceDaily
-from backend.models.stock_prices import StockPricesTable, StockPrices
+from backend.utils.db import get_db, load_portfolio_metadata
+from backend.models.portfolio_daily import PortfolioPerformanceDaily
+from backend.models.stock_prices import StockPrices
+from backend.services.data_queries import (
+    portfolio_daily_query, portfolio_daily_select, date_range_query, products_query, stock_prices_query,
+    type_split_select, FULL_PORTFOLIO_TICKER, TYPE_SPLIT_SUM_METRICS, TYPE_SPLIT_RATIO_METRICS,
+    snapshot_select, SNAPSHOT_COLUMNS, SNAPSHOT_TOTAL_COLUMNS
+)
+from backend.utils.isin_mapping import get_ticker_to_product_type, get_mapping_version
+from backend.utils.http_cache import data_cache_headers, is_not_modified, not_modified_response
+from backend.services.columnar_export import COLUMNAR_FORMATS, negotiate_format, columnar_chunks
 
 router = APIRouter()
 
 @router.get("/portfolio-daily", response_model=List[PortfolioPerformanceDaily], tags=["Data"])
 def get_portfolio_performance_daily(
+    response: Response,
     db: Session = Depends(get_db),
     products: Optional[List[str]] = Query(None, description="List of product names to filter by."),
     start_date: Optional[date] = Query(None, description="The start date for the data range (inclusive)."),
     end_date: Optional[date] = Query(None, description="The end date for the data range (inclusive)."),
+    format: Optional[str] = Query(None, description="Response format: json (default), arrow (Arrow IPC stream) or parquet. Overrides the Accept header."),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Retrieves daily portfolio performance data.
     Can be filtered by a list of products and a date range.
+    Besides JSON, the rows can be streamed column-wise as an Arrow IPC stream or Parquet file,
+    selected with the format parameter or the Accept header.
+    Responses carry an ETag of the data version, a matching If-None-Match is answered with 304 Not Modified.
     """
+    response_format = negotiate_format(format, accept)
+    if response_format != "json" and response_format not in COLUMNAR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{response_format}'")
+
     try:
-        query = db.query(PortfolioPerformanceDailyTable)
+        # The format is part of the ETag, as it's negotiated from the Accept header
+        headers = {**data_cache_headers(load_portfolio_metadata(), response_format), "Vary": "Accept"}
+        if is_not_modified(headers, if_none_match):
+            return not_modified_response(headers)
+        response.headers.update(headers)
 
-        if products:
-            query = query.filter(PortfolioPerformanceDailyTable.product.in_(products))
-        
-        if start_date:
-            # Filter records where the performance date is on or after the start_date
-            query = query.filter(PortfolioPerformanceDailyTable.end_date >= start_date)
+        if response_format in COLUMNAR_FORMATS:
+            return StreamingResponse(
+                columnar_chunks(portfolio_daily_select(products, start_date, end_date), response_format),
+                media_type=COLUMNAR_FORMATS[response_format],
+                headers=headers
+            )
 
-        if end_date:
-            # Filter records where the performance date is on or before the end_date
-            query = query.filter(PortfolioPerformanceDailyTable.end_date <= end_date)
+        query = portfolio_daily_query(db, products, start_date, end_date)
 
         results = query.all()
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load portfolio data: {e}")
 
+@router.get("/type-split", tags=["Data"], summary="Get Daily Metrics per Product Type")
+def get_type_split(
+    response: Response,
+    db: Session = Depends(get_db),
+    start_date: Optional[date] = Query(None, description="The start date for the data range (inclusive)."),
+    end_date: Optional[date] = Query(None, description="The end date for the data range (inclusive)."),
+    metrics: List[str] = Query(["net_performance_percentage"], description="Metrics to aggregate per product type."),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retrieves the daily metrics of the portfolio split by product type (from the ISIN mapping).
+    Amounts are summed over the products of a type and percentages are computed from those sums,
+    in the database, so only the grouped series are returned.
+    """
+    unknown_metrics = [metric for metric in metrics if metric not in TYPE_SPLIT_SUM_METRICS and metric not in TYPE_SPLIT_RATIO_METRICS]
+    if unknown_metrics:
+        raise HTTPException(status_code=400, detail=f"Unsupported metrics {unknown_metrics}")
+
+    try:
+        # Product types change with the mapping file, not with the data version
+        mapping_version = get_mapping_version()
+        headers = data_cache_headers(load_portfolio_metadata(), *(mapping_version or ()))
+        if is_not_modified(headers, if_none_match):
+            return not_modified_response(headers)
+        response.headers.update(headers)
+
+        ticker_types = {ticker: product_type for ticker, product_type in get_ticker_to_product_type().items() if ticker != FULL_PORTFOLIO_TICKER}
+        if not ticker_types:
+            return []
+
+        rows = db.execute(type_split_select(ticker_types, metrics, start_date, end_date)).mappings().all()
+        return [dict(row) for row in rows]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load type split: {e}")
+
+@router.get("/snapshot", tags=["Data"], summary="Get Portfolio Snapshot")
+def get_snapshot(
+    response: Response,
+    db: Session = Depends(get_db),
+    as_of: Optional[date] = Query(None, description="Snapshot date: the last day with data on or before it is used. Latest day by default."),
+    trend_days: int = Query(30, ge=1, le=366, description="Days of net performance in each product's trend."),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Retrieves each product's row on the snapshot day with its net performance trend, plus the
+    portfolio totals of that day and of the previous day with data. Computed in one query.
+    """
+    try:
+        headers = data_cache_headers(load_portfolio_metadata())
+        if is_not_modified(headers, if_none_match):
+            return not_modified_response(headers)
+        response.headers.update(headers)
+
+        rows = db.execute(snapshot_select(as_of, trend_days)).mappings().all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load portfolio snapshot: {e}")
+
+    current_rows = [row for row in rows if row["day_rank"] == 1]
+    if not current_rows:
+        return {"date": None, "previous_date": None, "totals": None, "previous_totals": None, "products": []}
+    # Only one day with data: it's also the previous day
+    previous_rows = [row for row in rows if row["day_rank"] == 2] or current_rows
+
+    return {
+        "date": current_rows[0]["end_date"].isoformat(),
+        "previous_date": previous_rows[0]["end_date"].isoformat(),
+        "totals": {column: current_rows[0][f"day_{column}"] for column in SNAPSHOT_TOTAL_COLUMNS},
+        "previous_totals": {column: previous_rows[0][f"day_{column}"] for column in SNAPSHOT_TOTAL_COLUMNS},
+        "products": [
+            {**{column: row[column] for column in SNAPSHOT_COLUMNS}, "trend": row["trend"]}
+            for row in current_rows
+        ],
+    }
+
 @router.get("/portfolio-metadata", tags=["Data"], summary="Get Portfolio Metadata for Filters")
-def get_portfolio_metadata(db: Session = Depends(get_db)):
+def get_portfolio_metadata(response: Response, db: Session = Depends(get_db), if_none_match: Optional[str] = Header(None)):
     """
     Retrieves distinct product names and the overall date range from the portfolio data.
     Used to populate filter controls in the frontend without loading the entire dataset.
+    Reads the portfolio_metadata summary written by the calculation job, and only falls back to
+    querying the daily table before the first calculation.
     """
     try:
+        metadata = load_portfolio_metadata()
+        if metadata is not None:
+            # calculated_at changes on every calculation, also when the data version doesn't
+            headers = data_cache_headers(metadata, int(metadata["calculated_at"].timestamp()) if metadata["calculated_at"] else None)
+            if is_not_modified(headers, if_none_match):
+                return not_modified_response(headers)
+            response.headers.update(headers)
+
+            return {
+                "products": metadata["products"],
+                "min_date": metadata["min_date"].isoformat() if metadata["min_date"] else None,
+                "max_date": metadata["max_date"].isoformat() if metadata["max_date"] else None,
+                "calculated_at": metadata["calculated_at"].isoformat() if metadata["calculated_at"] else None,
+                "data_version": metadata["data_version"],
+            }
+
         # Get min and max dates from the 'end_date' column
-        min_date_res, max_date_res = db.query(
-            func.min(PortfolioPerformanceDailyTable.end_date),
-            func.max(PortfolioPerformanceDailyTable.end_date)
-        ).one()
+        min_date_res, max_date_res = date_range_query(db).one()
 
         # Get unique product names
-        product_rows = db.query(PortfolioPerformanceDailyTable.product).distinct().all()
+        product_rows = products_query(db).all()
         # The result is a list of tuples, e.g., [('Product A',), ('Product B',)], extract the first element
         products = sorted([row[0] for row in product_rows if row[0] is not None])
 
@@ -61,14 +171,21 @@ def get_portfolio_metadata(db: Session = Depends(get_db)):
             "products": products,
             "min_date": min_date_res.isoformat() if min_date_res else None,
             "max_date": max_date_res.isoformat() if max_date_res else None,
+            "calculated_at": None,
+            "data_version": None,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load portfolio metadata: {e}")
 
 @router.get("/stock-prices", response_model=List[StockPrices], tags=["Data"])
-def get_stock_data(db: Session = Depends(get_db)):
+def get_stock_data(response: Response, db: Session = Depends(get_db), if_none_match: Optional[str] = Header(None)):
     try:
-        results = db.query(StockPricesTable).all()
+        headers = data_cache_headers(load_portfolio_metadata())
+        if is_not_modified(headers, if_none_match):
+            return not_modified_response(headers)
+        response.headers.update(headers)
+
+        results = stock_prices_query(db).all()
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load stock data: {e}")
\ No newline at end of file
@@ -1,8 +1,12 @@
 # backend/routes/debug.py
-from fastapi import APIRouter, HTTPException
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 from backend.utils.scheduler import scheduled_portfolio_job, scheduled_db_sync_job
 from backend.services.transactions import get_transactions
-from backend.utils.db import check_postgres_connection, delete_all_data
+from backend.utils.db import check_postgres_connection, delete_all_data, get_db
+from backend.services.data_queries import portfolio_daily_query, date_range_query, products_query, explain_analyze
 from backend.utils.logger import app_logger
 
 router = APIRouter()
@@ -31,3 +35,30 @@ def health_check_db():
         return {"status": "ok", "database": "connected"}
     else:
         raise HTTPException(status_code=500, detail="Cannot connect to database")
+
+@router.get("/explain/data")
+def explain_data_queries(
+    db: Session = Depends(get_db),
+    products: Optional[List[str]] = Query(None, description="Products of the filtered portfolio-daily query (default: the first product)."),
+    start_date: Optional[date] = Query(None, description="Start date of the filtered portfolio-daily query."),
+    end_date: Optional[date] = Query(None, description="End date of the filtered portfolio-daily query."),
+):
+    """
+    EXPLAIN ANALYZE plans of the /data query shapes, built with the same query builders as the
+    routes, to check which indexes they use. The queries are executed.
+    """
+    try:
+        if not products:
+            first_product = products_query(db).first()
+            products = [first_product[0]] if first_product else []
+
+        shapes = {
+            "portfolio-daily": portfolio_daily_query(db),
+            "portfolio-daily (products, date range)": portfolio_daily_query(db, products, start_date, end_date),
+            "portfolio-daily (date range)": portfolio_daily_query(db, None, start_date, end_date),
+            "portfolio-metadata (date range)": date_range_query(db),
+            "portfolio-metadata (products)": products_query(db),
+        }
+        return {name: explain_analyze(db, query) for name, query in shapes.items()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to explain data queries: {e}")
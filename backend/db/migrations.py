@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+from sqlalchemy import inspect, select, text, Float, Numeric
+from sqlalchemy.dialects.postgresql import insert
+from backend.models.schema_migrations import SchemaMigrationsTable
+from backend.utils.db import engine
+from backend.utils.logger import app_logger
+
+# pg_advisory_xact_lock key, so concurrently starting workers don't migrate at the same time
+MIGRATION_LOCK_KEY = 7291001
+
+def get_columns(conn, table_name):
+    return {c["name"]: c["type"] for c in inspect(conn).get_columns(table_name)}
+
+def move_to_dimension(conn, table_name, column, dimension_table, key_type):
+    """Replace a text column by a key (<column>_id) into its dimension table. No-op once moved."""
+    if column not in get_columns(conn, table_name):
+        return
+
+    key = f"{column}_id"
+    conn.execute(text(
+        f"INSERT INTO {dimension_table} ({column}) "
+        f"SELECT DISTINCT {column} FROM {table_name} WHERE {column} IS NOT NULL "
+        f"ON CONFLICT ({column}) DO NOTHING"
+    ))
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {key} {key_type} REFERENCES {dimension_table} ({key})"))
+    conn.execute(text(f"UPDATE {table_name} t SET {key} = d.{key} FROM {dimension_table} d WHERE d.{column} = t.{column}"))
+    conn.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column}"))
+
+def add_dimension_tables(conn):
+    move_to_dimension(conn, "portfolio_performance_daily", "product", "products", "integer")
+    move_to_dimension(conn, "stock_prices", "currency_pair", "currency_pairs", "smallint")
+
+def use_double_precision(conn):
+    # One ALTER per table, so each table is rewritten once (which also reclaims the dropped text columns)
+    for table_name in ("portfolio_performance_daily", "stock_prices"):
+        numeric_columns = [
+            name for name, column_type in get_columns(conn, table_name).items()
+            if isinstance(column_type, Numeric) and not isinstance(column_type, Float)
+        ]
+        if numeric_columns:
+            conn.execute(text(
+                f"ALTER TABLE {table_name} "
+                + ", ".join(f"ALTER COLUMN {name} TYPE double precision" for name in numeric_columns)
+            ))
+
+def add_data_api_indexes(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_portfolio_performance_daily_product_end_date "
+        "ON portfolio_performance_daily (product_id, end_date)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_portfolio_performance_daily_end_date "
+        "ON portfolio_performance_daily (end_date)"
+    ))
+    conn.execute(text("ANALYZE portfolio_performance_daily"))
+
+def add_price_refreshed_at(conn):
+    conn.execute(text("ALTER TABLE price_watermarks ADD COLUMN IF NOT EXISTS refreshed_at timestamptz"))
+    # Existing watermarks count as refreshed when they were last written
+    conn.execute(text("UPDATE price_watermarks SET refreshed_at = updated_at WHERE refreshed_at IS NULL"))
+
+# (version, name, migration). Append only; every migration must be a no-op on a schema created by create_tables.
+MIGRATIONS = [
+    (1, "product and currency_pair dimension tables", add_dimension_tables),
+    (2, "double precision metric columns", use_double_precision),
+    (3, "portfolio_performance_daily indexes for the data API filters", add_data_api_indexes),
+    (4, "price_watermarks refreshed_at for periodic full price refreshes", add_price_refreshed_at),
+]
+
+def run_migrations():
+    """Apply the migrations that aren't recorded in schema_migrations yet, each in its own transaction."""
+    for version, name, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            applied = conn.execute(select(SchemaMigrationsTable.version).where(SchemaMigrationsTable.version == version)).first()
+            if applied:
+                continue
+
+            app_logger.info(f"[DB] Applying schema migration {version}: {name}")
+            migrate_start = datetime.now(timezone.utc)
+            migrate(conn)
+            conn.execute(insert(SchemaMigrationsTable).values(version=version, name=name, applied_at=datetime.now(timezone.utc)))
+            app_logger.info(f"[DB] Schema migration {version} applied in {round((datetime.now(timezone.utc) - migrate_start).total_seconds(), 2)}s")
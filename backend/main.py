@@ -15,6 +15,7 @@ from backend.utils.scheduler import start_scheduled_tasks, scheduler
 app_logger.info("[STARTUP] Imported scheduler utilities.")
 
 from backend.utils.db import create_tables, wait_for_db
+from backend.db.migrations import run_migrations
 app_logger.info("[STARTUP] Imported database utilities.")
 
 app_logger.info("[STARTUP] All modules imported successfully. Proceeding with app setup.")
@@ -27,6 +28,7 @@ async def lifespan(app: FastAPI):
     try:
         wait_for_db()
         create_tables()
+        run_migrations()
         start_scheduled_tasks()
         app_logger.info("[STARTUP] Application startup complete. API is ready.")
     except Exception as e:
@@ -0,0 +1,17 @@
+from __future__ import annotations
+from sqlalchemy import Column, Integer, SmallInteger, String
+from backend.db.base import Base
+
+class ProductsTable(Base):
+    """Product names, stored in portfolio_performance_daily as product_id."""
+    __tablename__ = "products"
+
+    product_id = Column(Integer, primary_key=True, autoincrement=True)
+    product = Column(String, unique=True, nullable=False)
+
+class CurrencyPairsTable(Base):
+    """Currency pairs (e.g. USD-EUR), stored in stock_prices as currency_pair_id."""
+    __tablename__ = "currency_pairs"
+
+    currency_pair_id = Column(SmallInteger, primary_key=True, autoincrement=True)
+    currency_pair = Column(String, unique=True, nullable=False)
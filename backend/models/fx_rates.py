@@ -0,0 +1,25 @@
+from __future__ import annotations
+from sqlalchemy import Column, String, Date, Float, PrimaryKeyConstraint
+from backend.db.base import Base
+
+class FxRatesTable(Base):
+    __tablename__ = "fx_rates"
+
+    currency_pair = Column(String)
+    date = Column(Date)
+    rate = Column(Float)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('currency_pair', 'date'),
+    )
+
+class FxRateCoverageTable(Base):
+    """
+    Date range [start_date, end_date) of settled rates stored in fx_rates per currency pair.
+    Days in the range are never downloaded again.
+    """
+    __tablename__ = "fx_rate_coverage"
+
+    currency_pair = Column(String, primary_key=True)
+    start_date = Column(Date)
+    end_date = Column(Date)
@@ -1,30 +1,41 @@
 from __future__ import annotations
-from sqlalchemy import Column, String, Integer, Date, Numeric, PrimaryKeyConstraint
+from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, PrimaryKeyConstraint, Index, select
+from sqlalchemy.orm import column_property
 from backend.db.base import Base
+from backend.models.dimensions import ProductsTable
 from pydantic import BaseModel
 from datetime import date
 
 class PortfolioPerformanceDailyTable(Base):
     __tablename__ = "portfolio_performance_daily"
 
-    product = Column(String)
+    product_id = Column(Integer, ForeignKey("products.product_id"))
     ticker = Column(String)
     quantity = Column(Integer)
     start_date = Column(Date)
     end_date = Column(Date)
-    avg_cost = Column(Numeric)
-    cost_basis = Column(Numeric)
-    total_cost = Column(Numeric)
-    transaction_costs = Column(Numeric)
-    current_value = Column(Numeric)
-    current_money_weighted_return = Column(Numeric)
-    realized_return = Column(Numeric)
-    net_return = Column(Numeric)
-    current_performance_percentage = Column(Numeric)
-    net_performance_percentage = Column(Numeric)
+    avg_cost = Column(Float)
+    cost_basis = Column(Float)
+    total_cost = Column(Float)
+    transaction_costs = Column(Float)
+    current_value = Column(Float)
+    current_money_weighted_return = Column(Float)
+    realized_return = Column(Float)
+    net_return = Column(Float)
+    current_performance_percentage = Column(Float)
+    net_performance_percentage = Column(Float)
 
     __table_args__ = (
         PrimaryKeyConstraint('ticker', 'end_date'),
+        # /data/portfolio-daily product + date range filters and the products list
+        Index('ix_portfolio_performance_daily_product_end_date', 'product_id', 'end_date'),
+        # Date range filters over all products and MIN / MAX(end_date)
+        Index('ix_portfolio_performance_daily_end_date', 'end_date'),
+    )
+
+    # Product name from the products dimension table
+    product = column_property(
+        select(ProductsTable.product).where(ProductsTable.product_id == product_id).scalar_subquery()
     )
 
 class PortfolioPerformanceDaily(BaseModel):
@@ -0,0 +1,18 @@
+from __future__ import annotations
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime
+from sqlalchemy.dialects.postgresql import ARRAY
+from backend.db.base import Base
+
+class PortfolioMetadataTable(Base):
+    """
+    Single-row summary of portfolio_performance_daily, written by calc_portfolio at the end of each run.
+    data_version increases whenever the stored data changes.
+    """
+    __tablename__ = "portfolio_metadata"
+
+    id = Column(Integer, primary_key=True, autoincrement=False, default=1)
+    products = Column(ARRAY(String))
+    min_date = Column(Date)
+    max_date = Column(Date)
+    calculated_at = Column(DateTime(timezone=True))
+    data_version = Column(BigInteger)
@@ -0,0 +1,25 @@
+from __future__ import annotations
+from sqlalchemy import Column, String, Date, Float, PrimaryKeyConstraint
+from backend.db.base import Base
+
+class PositionSnapshotsTable(Base):
+    """
+    PositionLedger state of a ticker after all transactions up to and including `date`.
+    Stored as double precision so a resumed ledger continues from exactly the same floats.
+    """
+    __tablename__ = "position_snapshots"
+
+    ticker = Column(String)
+    date = Column(Date)
+    quantity_held = Column(Float)
+    purchase_cost = Column(Float)
+    fees = Column(Float)
+    buy_quantity = Column(Float)
+    buy_cost = Column(Float)
+    sell_quantity = Column(Float)
+    sell_value = Column(Float)
+    realized_return = Column(Float)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('ticker', 'date'),
+    )
@@ -0,0 +1,16 @@
+from __future__ import annotations
+from sqlalchemy import Column, String, Date, DateTime
+from backend.db.base import Base
+
+class PriceWatermarksTable(Base):
+    """
+    Per-ticker "finalized-through" date: prices and daily rows up to and including
+    finalized_through were calculated from settled end-of-day closes and are not refetched.
+    refreshed_at is when the ticker's full price history was last fetched (see PRICE_FULL_REFRESH_DAYS).
+    """
+    __tablename__ = "price_watermarks"
+
+    ticker = Column(String, primary_key=True)
+    finalized_through = Column(Date)
+    updated_at = Column(DateTime(timezone=True))
+    refreshed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,11 @@
+from __future__ import annotations
+from sqlalchemy import Column, Integer, String, DateTime
+from backend.db.base import Base
+
+class SchemaMigrationsTable(Base):
+    """Versions of the schema migrations (backend/db/migrations.py) applied to the database."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String)
+    applied_at = Column(DateTime(timezone=True))
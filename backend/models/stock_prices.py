@@ -1,6 +1,8 @@
 from __future__ import annotations
-from sqlalchemy import Column, String, Date, Numeric, PrimaryKeyConstraint
+from sqlalchemy import Column, String, Date, Float, SmallInteger, ForeignKey, PrimaryKeyConstraint, select
+from sqlalchemy.orm import column_property
 from backend.db.base import Base
+from backend.models.dimensions import CurrencyPairsTable
 from pydantic import BaseModel
 from datetime import date
 
@@ -9,14 +11,19 @@ class StockPricesTable(Base):
 
     ticker = Column(String)
     date = Column(Date)
-    price = Column(Numeric)
-    fx_rate = Column(Numeric)
-    currency_pair = Column(String)
+    price = Column(Float)
+    fx_rate = Column(Float)
+    currency_pair_id = Column(SmallInteger, ForeignKey("currency_pairs.currency_pair_id"))
 
     __table_args__ = (
         PrimaryKeyConstraint('ticker', 'date'),
     )
 
+    # Currency pair from the currency_pairs dimension table
+    currency_pair = column_property(
+        select(CurrencyPairsTable.currency_pair).where(CurrencyPairsTable.currency_pair_id == currency_pair_id).scalar_subquery()
+    )
+
 class StockPrices(BaseModel):
     """
     Defines the data structure for daily stock prices.
@@ -0,0 +1,115 @@
+import io
+from itertools import chain
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Date, Float, Integer, Numeric, String
+from backend.utils.db import engine, select_column, DB_FETCH_CHUNK_ROWS
+from backend.utils.logger import app_logger
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+COLUMNAR_FORMATS = {"arrow": ARROW_STREAM_MEDIA_TYPE, "parquet": PARQUET_MEDIA_TYPE}
+
+def negotiate_format(format=None, accept=None):
+    """Response format of a data request: the format parameter wins over the Accept header, JSON by default."""
+    if format:
+        return format.lower()
+    for media_type in (accept or "").split(","):
+        media_type = media_type.split(";")[0].strip().lower()
+        for name, columnar_media_type in COLUMNAR_FORMATS.items():
+            if media_type == columnar_media_type:
+                return name
+    return "json"
+
+def arrow_type(column_type):
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(column_type, String):
+        return pa.string()
+    raise TypeError(f"No Arrow type for {column_type}")
+
+def arrow_schema(stmt):
+    return pa.schema([(column.name, arrow_type(column.type)) for column in stmt.selected_columns])
+
+def iter_record_batches(stmt, schema, chunk_rows=DB_FETCH_CHUNK_ROWS):
+    """Record batches of a select, built column-wise from chunks of a server-side cursor."""
+    stmt = stmt.with_only_columns(*[select_column(column) for column in stmt.selected_columns])
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(stmt)
+        for rows in result.partitions(chunk_rows):
+            columns = zip(*rows)
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+
+class DrainableBuffer(io.RawIOBase):
+    """Write-only sink whose written bytes are taken out with drain(), so a stream can be sent while it's written."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def open_record_batches(stmt, schema):
+    """
+    Record batches of a select, with the query already run and the first batch read,
+    so query errors are raised here instead of inside a streamed response.
+    """
+    batches = iter_record_batches(stmt, schema)
+    first = next(batches, None)
+    return chain([first] if first is not None else [], batches)
+
+def arrow_stream_chunks(schema, batches):
+    """Arrow IPC stream of record batches, yielded one batch at a time."""
+    sink = DrainableBuffer()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def parquet_chunks(schema, batches):
+    """Parquet file of record batches, one row group per batch, yielded as it is written."""
+    sink = DrainableBuffer()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def abort_on_error(chunks, format):
+    """
+    Log an error raised while a response is streamed and re-raise it. The status line has been sent,
+    so the connection is aborted instead of ending a truncated body as if it were complete.
+    """
+    try:
+        yield from chunks
+    except Exception:
+        app_logger.error(f"[DATA-API] Streaming the {format} response failed, aborting the connection", exc_info=True)
+        raise
+
+def columnar_chunks(stmt, format):
+    """
+    Chunks of a select as an Arrow IPC stream or Parquet file. The query is run before this returns,
+    so a failing query can still be answered with an error status.
+    """
+    schema = arrow_schema(stmt)
+    batches = open_record_batches(stmt, schema)
+    chunks = arrow_stream_chunks(schema, batches) if format == "arrow" else parquet_chunks(schema, batches)
+    return abort_on_error(chunks, format)
@@ -0,0 +1,145 @@
+from sqlalchemy import case, func, select, text, Float
+from backend.models.portfolio_daily import PortfolioPerformanceDailyTable
+from backend.models.stock_prices import StockPricesTable
+from backend.models.dimensions import ProductsTable
+
+def filter_portfolio_daily(query, products=None, start_date=None, end_date=None):
+    """Apply the /data/portfolio-daily filters to an ORM query or Core select of the daily table."""
+    if products:
+        query = query.filter(PortfolioPerformanceDailyTable.product_id.in_(
+            select(ProductsTable.product_id).where(ProductsTable.product.in_(products))
+        ))
+
+    if start_date:
+        # Filter records where the performance date is on or after the start_date
+        query = query.filter(PortfolioPerformanceDailyTable.end_date >= start_date)
+
+    if end_date:
+        # Filter records where the performance date is on or before the end_date
+        query = query.filter(PortfolioPerformanceDailyTable.end_date <= end_date)
+
+    return query
+
+def portfolio_daily_query(db, products=None, start_date=None, end_date=None):
+    """Daily portfolio rows, optionally of the products and with end_date in [start_date, end_date]."""
+    return filter_portfolio_daily(db.query(PortfolioPerformanceDailyTable), products, start_date, end_date)
+
+def portfolio_daily_select(products=None, start_date=None, end_date=None):
+    """
+    Core select of the same rows as portfolio_daily_query, with the product name joined in and the
+    columns in PortfolioPerformanceDaily order (for the columnar response formats).
+    """
+    table = PortfolioPerformanceDailyTable.__table__
+    stmt = (
+        select(ProductsTable.product, *[c for c in table.columns if c.name != 'product_id'])
+        .select_from(table)
+        .outerjoin(ProductsTable, ProductsTable.product_id == table.c.product_id)
+    )
+    return filter_portfolio_daily(stmt, products, start_date, end_date)
+
+# Ticker of the "Full portfolio" rows, left out of the product type split
+FULL_PORTFOLIO_TICKER = "FULL"
+
+# Type split metrics summed over the products of a type, and percentages computed from those sums
+TYPE_SPLIT_SUM_METRICS = [
+    'quantity', 'avg_cost', 'cost_basis', 'total_cost', 'transaction_costs', 'current_value',
+    'current_money_weighted_return', 'realized_return', 'net_return'
+]
+TYPE_SPLIT_RATIO_METRICS = {
+    'net_performance_percentage': ('net_return', 'total_cost'),
+    'current_performance_percentage': ('current_money_weighted_return', 'cost_basis'),
+}
+
+def type_split_select(ticker_types, metrics, start_date=None, end_date=None):
+    """
+    Daily metrics per product type: one (end_date, product_type, *metrics) row per day and type.
+    ticker_types maps tickers to their product type (at least one); other tickers are left out.
+    Sum metrics are summed over the type's products, percentages are the ratio of those sums.
+    """
+    table = PortfolioPerformanceDailyTable.__table__
+    product_type = case(ticker_types, value=table.c.ticker).label("product_type")
+
+    metric_columns = []
+    for metric in metrics:
+        if metric in TYPE_SPLIT_RATIO_METRICS:
+            numerator, denominator = TYPE_SPLIT_RATIO_METRICS[metric]
+            value = func.sum(table.c[numerator]) / func.nullif(func.sum(table.c[denominator]), 0, type_=Float) * 100
+        else:
+            value = func.sum(table.c[metric])
+        metric_columns.append(value.label(metric))
+
+    stmt = (
+        select(table.c.end_date, product_type, *metric_columns)
+        .where(table.c.ticker.in_(list(ticker_types)))
+        .group_by(table.c.end_date, product_type)
+        .order_by(table.c.end_date, product_type)
+    )
+    return filter_portfolio_daily(stmt, start_date=start_date, end_date=end_date)
+
+# Columns of each product's row in the portfolio snapshot, and the columns totalled per day
+SNAPSHOT_COLUMNS = [
+    'product', 'ticker', 'end_date', 'quantity', 'avg_cost', 'cost_basis', 'total_cost', 'current_value',
+    'current_money_weighted_return', 'realized_return', 'net_return',
+    'current_performance_percentage', 'net_performance_percentage'
+]
+SNAPSHOT_TOTAL_COLUMNS = ['current_value', 'net_return', 'total_cost']
+
+def snapshot_select(as_of=None, trend_days=30):
+    """
+    Rows of the last two days with data on or before as_of (latest day if None), without the Full portfolio.
+
+    Window functions add to each row its day_rank (1 = snapshot day, 2 = the day before), the day's totals
+    (day_<column>) and a trend array of its net_performance_percentage over the trend_days before its day.
+    """
+    table = PortfolioPerformanceDailyTable.__table__
+    latest_day = select(func.max(table.c.end_date)).where(table.c.ticker != FULL_PORTFOLIO_TICKER)
+    if as_of:
+        latest_day = latest_day.where(table.c.end_date <= as_of)
+    latest_day = latest_day.correlate(None).scalar_subquery()
+
+    recent = (
+        select(
+            ProductsTable.product,
+            *[table.c[column] for column in SNAPSHOT_COLUMNS if column != 'product'],
+            func.dense_rank().over(order_by=table.c.end_date.desc()).label("day_rank"),
+            *[
+                func.sum(table.c[column]).over(partition_by=table.c.end_date).label(f"day_{column}")
+                for column in SNAPSHOT_TOTAL_COLUMNS
+            ],
+            func.array_agg(table.c.net_performance_percentage).over(
+                partition_by=table.c.ticker, order_by=table.c.end_date, rows=(None, 0)
+            ).label("trend"),
+        )
+        .select_from(table)
+        .outerjoin(ProductsTable, ProductsTable.product_id == table.c.product_id)
+        .where(
+            table.c.ticker != FULL_PORTFOLIO_TICKER,
+            table.c.end_date <= latest_day,
+            table.c.end_date >= latest_day - trend_days,
+        )
+        .subquery("recent")
+    )
+    return select(recent).where(recent.c.day_rank <= 2).order_by(recent.c.day_rank, recent.c.ticker)
+
+def date_range_query(db):
+    """(min, max) end_date of the daily portfolio rows."""
+    return db.query(
+        func.min(PortfolioPerformanceDailyTable.end_date),
+        func.max(PortfolioPerformanceDailyTable.end_date)
+    )
+
+def products_query(db):
+    """Names of the products that have daily portfolio rows."""
+    return db.query(ProductsTable.product).filter(
+        db.query(PortfolioPerformanceDailyTable.product_id)
+        .filter(PortfolioPerformanceDailyTable.product_id == ProductsTable.product_id)
+        .exists()
+    )
+
+def stock_prices_query(db):
+    return db.query(StockPricesTable)
+
+def explain_analyze(db, query):
+    """EXPLAIN ANALYZE plan lines of a query (the query is executed)."""
+    compiled = query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return [row[0] for row in db.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {compiled}"))]
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+def lttb_indices(x, y, n):
+    """
+    Indices of the n points picked by Largest-Triangle-Three-Buckets: the first and last point,
+    plus per bucket the point spanning the largest triangle with the previous pick and the next bucket's mean.
+    Keeps the visual shape of the line.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    selected = [0]
+    previous = 0
+    for i in range(n - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+        else:
+            next_start, next_end = size - 1, size
+        mean_x, mean_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - mean_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (mean_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected.append(previous)
+    selected.append(size - 1)
+    return np.unique(selected)
+
+def minmax_indices(x, y, n):
+    """
+    Indices of the minimum and maximum point of n // 2 equal buckets, so every extreme is kept.
+    Each bucket yields a pair, so an odd n returns at most n - 1 points (n=3 gives 2).
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+
+    selected = []
+    for bucket in np.array_split(np.arange(size), n // 2):
+        selected.extend([bucket[np.argmin(y[bucket])], bucket[np.argmax(y[bucket])]])
+    return np.unique(selected)
+
+DOWNSAMPLERS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+def downsample_rows(x, values, max_points, method="lttb"):
+    """
+    Sorted positions of the rows to keep of one series sorted on x: the union of the points picked
+    for each metric in values ({metric: y array}), which share max_points evenly. NaN points are skipped.
+    """
+    downsampler = DOWNSAMPLERS[method]
+    metric_points = max_points // len(values)
+
+    picked = set()
+    for y in values.values():
+        valid = np.flatnonzero(~np.isnan(y))
+        picked.update(valid[downsampler(x[valid], y[valid], metric_points)])
+    return np.array(sorted(picked), dtype=np.int64)
+
+def downsample_frame(df, max_points, metrics, x_column, method="lttb"):
+    """Rows of a single series DataFrame (e.g. one product) reduced to at most max_points, sorted on x_column."""
+    df = df.sort_values(x_column)
+    x = pd.to_datetime(df[x_column]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    values = {metric: df[metric].to_numpy(dtype=float) for metric in metrics}
+    return df.iloc[downsample_rows(x, values, max_points, method)]
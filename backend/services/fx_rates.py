@@ -0,0 +1,130 @@
+from datetime import timedelta
+import pandas as pd
+from backend.services.price_provider import fx_ticker
+from backend.utils.db import load_fx_rates_from_db, save_fx_rates_to_db, load_fx_rate_coverage, save_fx_rate_coverage
+from backend.utils.logger import app_logger
+
+FX_RATE_COLUMNS = ["currency_pair", "date", "rate"]
+
+def currency_pair(first_currency, second_currency):
+    """Currency pair key as stored in fx_rates and stock_prices, e.g. USD-EUR."""
+    return f"{first_currency}-{second_currency}"
+
+def get_missing_spans(coverage, start, end):
+    """
+    [start, end) spans outside a pair's covered range. Gaps are extended up to the
+    covered range so the range stays contiguous once they are fetched.
+    """
+    if coverage is None:
+        return [(start, end)] if start < end else []
+
+    covered_start, covered_end = coverage
+    spans = []
+    if start < covered_start:
+        spans.append((start, covered_start))
+    if end > covered_end:
+        spans.append((covered_end, end))
+    return spans
+
+def load_fx_rates(currencies, second_currency, start, end, provider, settled_through):
+    """
+    FX rates of the currencies to second_currency in [start, end) from the fx_rates table.
+
+    Only the spans outside a pair's covered range are downloaded with the provider. Settled days of
+    spans that returned rates extend the covered range, provisional days after settled_through are
+    downloaded again next run; pairs that failed or returned no rates keep their range and are retried next run.
+    Returns (DataFrame of currency_pair, date, rate, {currency_pair: (start_date, end_date)} coverage).
+    """
+    pairs = {currency: currency_pair(currency, second_currency) for currency in currencies}
+    if not pairs:
+        return pd.DataFrame(columns=FX_RATE_COLUMNS), {}
+
+    coverage = load_fx_rate_coverage(pairs.values())
+
+    # Currencies with the same missing span are fetched together
+    fetch_groups = {}
+    for currency, pair in pairs.items():
+        for span in get_missing_spans(coverage.get(pair), start, end):
+            fetch_groups.setdefault(span, []).append(currency)
+
+    fetched_spans = {}
+    failed_currencies = set()
+    for (span_start, span_end), span_currencies in sorted(fetch_groups.items()):
+        app_logger.info(f"[FX-RATES] Fetching {len(span_currencies)} currency pair(s) from {span_start.isoformat()} to {span_end.isoformat()}")
+        tickers = {fx_ticker(currency, second_currency): currency for currency in span_currencies}
+        fetched, failed_tickers = provider.get_prices_with_failures(list(tickers), span_start, span_end)
+
+        records = []
+        for ticker, currency in tickers.items():
+            if ticker in failed_tickers:
+                failed_currencies.add(currency)
+                continue
+            rates = [
+                {"currency_pair": pairs[currency], "date": day, "rate": rate}
+                for day, rate in fetched.get(ticker, {}).items()
+                if rate == rate
+            ]
+            if not rates:
+                app_logger.warning(f"[FX-RATES] No rates returned for {pairs[currency]} from {span_start.isoformat()} to {span_end.isoformat()}")
+                continue
+            fetched_spans.setdefault(currency, []).append((span_start, span_end))
+            records.extend(rates)
+        inserted, updated, skipped = save_fx_rates_to_db(pd.DataFrame(records, columns=FX_RATE_COLUMNS))
+        app_logger.info(f"[FX-RATES] Saved FX rates to DB: {inserted} inserted, {updated} updated, {skipped} skipped")
+
+    if failed_currencies:
+        app_logger.warning(f"[FX-RATES] Fetch failed for {sorted(failed_currencies)}, retrying on the next run")
+
+    # Extend the covered range with the fetched spans, up to the settled day
+    settled_end = settled_through + timedelta(days=1)
+    new_coverage = {}
+    for currency, spans in fetched_spans.items():
+        if currency in failed_currencies:
+            continue
+        pair = pairs[currency]
+        range_starts = [span_start for span_start, _ in spans]
+        range_ends = [min(span_end, settled_end) for _, span_end in spans]
+        if pair in coverage:
+            range_starts.append(coverage[pair][0])
+            range_ends.append(coverage[pair][1])
+        if min(range_starts) < max(range_ends):
+            new_coverage[pair] = (min(range_starts), max(range_ends))
+    save_fx_rate_coverage(new_coverage)
+
+    return load_fx_rates_from_db(pairs.values(), start, end), {**coverage, **new_coverage}
+
+def convert_prices(prices, ticker_currency, fx_rates, second_currency):
+    """
+    Convert a long (ticker, date, price) DataFrame to second_currency.
+
+    Prices and FX rates are aligned with an as-of join per currency pair: each price is
+    multiplied by the last rate on or before its date, prices before a pair's first rate use
+    that first rate. Prices already in second_currency keep a rate of 1. Tickers whose pair has
+    no rate at all are logged and left out, rather than kept in their own currency.
+    Returns the frame (sorted on date) with added currency_pair and fx_rate columns.
+    """
+    prices = prices.assign(
+        date=pd.to_datetime(prices["date"]),
+        currency_pair=prices["ticker"].map(ticker_currency).fillna(second_currency) + f"-{second_currency}",
+    ).sort_values("date", kind="stable")
+
+    fx_rates = pd.DataFrame({
+        "currency_pair": fx_rates["currency_pair"].astype(object),
+        "date": pd.to_datetime(fx_rates["date"]),
+        "fx_rate": fx_rates["rate"].astype(float),
+    }).sort_values("date", kind="stable")
+
+    converted = pd.merge_asof(prices, fx_rates, on="date", by="currency_pair", direction="backward")
+    first_rates = pd.merge_asof(prices, fx_rates, on="date", by="currency_pair", direction="forward")["fx_rate"]
+    converted["fx_rate"] = converted["fx_rate"].fillna(first_rates)
+    converted.loc[converted["currency_pair"] == f"{second_currency}-{second_currency}", "fx_rate"] = 1.0
+
+    missing = converted["fx_rate"].isna()
+    if missing.any():
+        skipped = converted.loc[missing].groupby("ticker")["currency_pair"].first()
+        for ticker, pair in skipped.items():
+            app_logger.warning(f"[FX-RATES] No {pair} rate available, skipping prices of {ticker}")
+        converted = converted[~converted["ticker"].isin(skipped.index)]
+
+    converted["price"] = converted["price"] * converted["fx_rate"]
+    return converted
@@ -1,34 +1,118 @@
 import os
 from datetime import datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
-import json
 import warnings
 import time
-import math
 from backend.utils.logger import app_logger
-from backend.services.transactions import get_transactions
+from backend.services.transactions import get_transactions, save_transaction_fingerprints
+from backend.services.portfolio_matrix import calculate_portfolio_rows_from_stock_rows
+from backend.services.price_series import PriceSeries
+from backend.services.price_provider import get_price_provider
+from backend.services.fx_rates import load_fx_rates, convert_prices, currency_pair
+from backend.services.price_cache import PriceCache, CachedPriceProvider, get_settled_through
 from backend.services.portfolio_analyzer import PortfolioAnalyzer
+from backend.utils.isin_mapping import get_ticker_to_name
 from backend.utils.refresh_status import set_refresh_status, get_refresh_status
-from backend.utils.db import SessionLocal, load_portfolio_performance_from_db, load_stock_prices_from_db, save_portfolio_performance_to_db, save_stock_prices_to_db
+from backend.utils.db import SessionLocal, load_portfolio_performance_from_db, save_portfolio_performance_to_db, load_stock_prices_from_db, save_stock_prices_to_db, load_position_snapshots, save_position_snapshots_to_db, delete_position_snapshots_from_dates, load_price_watermarks, load_stale_price_tickers, save_price_watermarks, save_portfolio_metadata
 
 warnings.simplefilter(action='ignore', category=pd.errors.SettingWithCopyWarning)
 
-def is_rate_limited(price_dict: dict) -> bool:
+# Parallel per-ticker calculation (set PORTFOLIO_CALC_PARALLEL=false to run serially for debugging)
+CALC_PARALLEL = os.getenv("PORTFOLIO_CALC_PARALLEL", "true").lower() in ("1", "true", "yes")
+CALC_WORKERS = int(os.getenv("PORTFOLIO_CALC_WORKERS", os.cpu_count() or 1))
+
+# Days after which a ticker's full price history is fetched and recalculated again, so corrected
+# or split-adjusted closes behind the watermark are picked up (0 disables the periodic refresh)
+PRICE_FULL_REFRESH_DAYS = int(os.getenv("PRICE_FULL_REFRESH_DAYS", "30"))
+
+def get_changed_rows(df, stored_df, key_columns):
+    """
+    Rows of df that are new or differ from the stored row with the same key columns.
+    Numeric values are compared as floats with a small tolerance, NaN equals NaN.
+    """
+    value_columns = [c for c in df.columns if c not in key_columns and c in stored_df.columns]
+    if stored_df.empty or df.empty:
+        return df
+
+    stored = stored_df[key_columns + value_columns].drop_duplicates(subset=key_columns, keep='last')
+    merged = df[key_columns + value_columns].merge(stored, on=key_columns, how='left', suffixes=('', '_stored'), indicator=True)
+
+    changed = (merged['_merge'] == 'left_only').to_numpy()
+    for column in value_columns:
+        new_values, stored_values = merged[column], merged[f"{column}_stored"]
+        new_numeric = pd.to_numeric(new_values, errors='coerce')
+        if new_values.notna().sum() == new_numeric.notna().sum():
+            equal = np.isclose(new_numeric.to_numpy(float), pd.to_numeric(stored_values, errors='coerce').to_numpy(float), rtol=0, atol=1e-9, equal_nan=True)
+        else:
+            equal = ((new_values == stored_values) | (new_values.isna() & stored_values.isna())).to_numpy()
+        changed |= ~equal
+
+    return df[changed]
+
+def load_resume_snapshots(end_dates):
     """
-    Detect Yahoo Finance rate limiting when ALL tickers return only NaN values.
+    Latest stored position snapshot per ticker on or before the first of end_dates,
+    so the calculation only has to roll the ledgers forward from there.
     """
-    if not price_dict:
-        return True
+    if not end_dates:
+        return {}
+    try:
+        snapshots = load_position_snapshots(min(end_dates))
+        app_logger.info(f"[PORTFOLIO-CALC] Loaded position snapshots for {len(snapshots)} tickers")
+        return snapshots
+    except Exception as e:
+        app_logger.warning(f"[PORTFOLIO-CALC] Failed to load position snapshots from DB, replaying all transactions: {e}")
+        return {}
 
-    for ticker, date_price_map in price_dict.items():
-        if not date_price_map:
-            continue
+def seed_price_cache(price_cache, tickers, start_date, price_watermarks):
+    """
+    Fill a cold price cache from the stored stock_prices, which hold final prices from start_date
+    up to each ticker's watermark, instead of downloading the full history again.
+    """
+    try:
+        stored = load_stock_prices_from_db(columns=['ticker', 'date', 'price', 'fx_rate'], tickers=tickers)
+    except Exception as e:
+        app_logger.warning(f"[PORTFOLIO-CALC] Failed to load stock prices from DB, fetching the full history: {e}")
+        return
 
-        for price in date_price_map.values():
-            if price is not None and not math.isnan(price):
-                return False  # Found at least one valid price
+    # Stored prices are converted to EUR, the cache holds them in the ticker's own currency
+    watermarks = pd.to_datetime(stored['ticker'].map(price_watermarks))
+    stored = stored[(stored['date'] <= watermarks) & (stored['fx_rate'] > 0)]
+    stored = stored.assign(price=stored['price'] / stored['fx_rate'])
 
-    return True
+    price_cache.seed(stored, start_date, price_watermarks)
+    app_logger.info(f"[PORTFOLIO-CALC] Seeded the price cache with {len(stored)} stored prices of {stored['ticker'].nunique()} ticker(s)")
+
+def get_finalized_watermarks(tickers, price_cache, prices_df, price_watermarks, start_date, settled_through, ticker_currency, fx_coverage):
+    """
+    New finalized-through date per ticker. A watermark moves to settled_through when the cache covers
+    every day since the previous watermark, i.e. the source answered for all settled days, also when it
+    had no newer prices (e.g. delisted). Otherwise it moves to the last settled day with a cached price,
+    if the cache covers the days up to it. Foreign tickers also need the FX rates to cover those days.
+    Returns {ticker: date}; watermarks never move back.
+    """
+    settled_prices = prices_df[prices_df['date'] <= pd.Timestamp(settled_through)]
+    last_price_days = settled_prices.groupby('ticker')['date'].max().dt.date.to_dict()
+
+    finalized = {}
+    for ticker in tickers:
+        first_day = price_watermarks[ticker] + timedelta(days=1) if ticker in price_watermarks else start_date
+        candidates = [settled_through, last_price_days.get(ticker)]
+        through = next((
+            day for day in candidates
+            if day is not None and not price_cache.get_missing_spans(ticker, first_day, day + timedelta(days=1))
+        ), None)
+        if through is None:
+            continue
+
+        currency = ticker_currency.get(ticker, 'EUR')
+        if currency != 'EUR':
+            fx_start, fx_end = fx_coverage.get(currency_pair(currency, 'EUR'), (None, None))
+            if fx_start is None or fx_start > first_day or fx_end <= through:
+                continue
+        finalized[ticker] = max(through, price_watermarks.get(ticker, through))
+    return finalized
 
 def calc_portfolio():
     app_logger.info("[PORTFOLIO-CALC] Starting portfolio calculation...")
@@ -38,15 +122,23 @@ def calc_portfolio():
         start_time = time.time()
 
         # Get the transactions DataFrame from the service
-        transactions_df = get_transactions()
+        transactions_df, changed_tickers, transaction_fingerprints = get_transactions(with_changes=True)
         app_logger.info(f"[PORTFOLIO-CALC] Retrieved transactions DataFrame with {len(transactions_df)} rows.")
-        
-        # Instantiate the analyzer with the transaction data
-        analyzer = PortfolioAnalyzer(transactions_df)
 
         if transactions_df.empty:
             app_logger.warning("[PORTFOLIO-CALC] No transactions found. Skipping portfolio calculation.")
             return
+
+        # Instantiate the analyzer with the transaction data.
+        # Prices are served from the local price cache, only uncovered and provisional (unsettled) spans are fetched.
+        now = datetime.now(timezone.utc)
+        settled_through = get_settled_through(now)
+        price_cache = PriceCache()
+        price_source = get_price_provider()
+        analyzer = PortfolioAnalyzer(
+            transactions_df,
+            price_provider=CachedPriceProvider(price_source, price_cache, settled_through)
+        )
         
         app_logger.info("[PORTFOLIO-CALC] Retrieving portfolio data...")
         
@@ -58,66 +150,76 @@ def calc_portfolio():
         
         transactions["Date"] = pd.to_datetime(transactions["Date"], utc=True).dt.date
         start_date = transactions['Date'].min()
-        today = datetime.now(timezone.utc).date()
+        today = now.date()
         end_dates = [d.date() for d in pd.date_range(start=start_date, end=today, freq='D')[1:]]  # Exclude the start_date itself
 
         app_logger.info(f"[PORTFOLIO-CALC] Processing portfolio performance from {start_date.isoformat()} to {today.isoformat()}")
 
-        # Initialize an empty list to store portfolio data for each day
-        portfolio_results_list = []
-
         # Get recent stock price data for new end_dates
         stock_list = transactions["Stock"].unique().tolist() # All stocks
 
-        yf_start_date = start_date if len(end_dates) > 30 else (today - timedelta(days=30))
-        yf_stock_price_data = analyzer.get_price_at_date(stock_list, yf_start_date.strftime('%Y-%m-%d'), (today + timedelta(days=1)).strftime('%Y-%m-%d'))
+        # Days after each ticker's finalized-through watermark hold provisional prices (all days without one)
+        try:
+            price_watermarks = load_price_watermarks()
+        except Exception as e:
+            app_logger.warning(f"[PORTFOLIO-CALC] Failed to load price watermarks from DB: {e}")
+            price_watermarks = {}
+
+        # Periodic full refresh: stale tickers lose their watermark and cache coverage
+        stale_tickers = set()
+        if PRICE_FULL_REFRESH_DAYS > 0 and price_watermarks:
+            try:
+                stale_tickers = set(load_stale_price_tickers(now - timedelta(days=PRICE_FULL_REFRESH_DAYS))) & set(stock_list)
+            except Exception as e:
+                app_logger.warning(f"[PORTFOLIO-CALC] Failed to load price refresh dates from DB: {e}")
+            if stale_tickers:
+                app_logger.info(f"[PORTFOLIO-CALC] Full price refresh for {len(stale_tickers)} ticker(s) older than {PRICE_FULL_REFRESH_DAYS} days")
+                price_cache.clear_coverage(stale_tickers)
+                price_watermarks = {ticker: day for ticker, day in price_watermarks.items() if ticker not in stale_tickers}
+
+        # Tickers without a watermark get their full price history fetched in this run
+        full_refresh_tickers = [ticker for ticker in stock_list if ticker not in price_watermarks]
+
+        # A cold cache (e.g. a fresh container) starts from the stored final prices
+        cold_tickers = [ticker for ticker in stock_list if ticker in price_watermarks and not price_cache.has_coverage(ticker)]
+        if cold_tickers:
+            seed_price_cache(price_cache, cold_tickers, start_date, price_watermarks)
+
+        price_refresh_from = {
+            ticker: price_watermarks[ticker] + timedelta(days=1) if ticker in price_watermarks else start_date
+            for ticker in stock_list
+        }
+
+        # Full price history, read from the cache. Tickers that fail to fetch (e.g. throttled) are
+        # calculated with their cached prices, their watermark isn't moved and they are fetched again next run.
+        prices_df = analyzer.price_provider.get_price_frame(stock_list, start_date, today + timedelta(days=1))
 
-        if is_rate_limited(yf_stock_price_data):
-            raise RuntimeError("Rate limit detected (all prices NaN)")
+        if prices_df.empty:
+            raise RuntimeError("Rate limit detected (no prices fetched or cached)")
+        if analyzer.price_provider.failed_tickers:
+            app_logger.warning(f"[PORTFOLIO-CALC] Continuing without fresh prices for {len(analyzer.price_provider.failed_tickers)} ticker(s)")
     
         # Update stock prices to EUR
         # Remove duplicates and create ticker-to-currency dict
         ticker_currency_dict = transactions.drop_duplicates(subset=['Stock', 'Currency'])\
                                         .set_index('Stock')['Currency'].to_dict()
+        currencies = sorted({currency for currency in ticker_currency_dict.values() if currency != 'EUR'})
 
-        # Group tickers by currency (excluding EUR)
-        currency_ticker_map = {}
-        for ticker, currency in ticker_currency_dict.items():
-            if currency != 'EUR':
-                currency_ticker_map.setdefault(currency, []).append(ticker)
-
-        # Fetch FX rates once per currency
-        fx_rates_by_currency = {}
-        for currency in currency_ticker_map:
-            fx_rates_by_currency[currency] = analyzer.get_fx_rate(
-                currency, 'EUR',
-                yf_start_date.strftime('%Y-%m-%d'),
-                (today + timedelta(days=1)).strftime('%Y-%m-%d')
-            )
+        # FX rates from the fx_rates table, only pairs / spans that aren't covered yet are downloaded
+        fx_rates_df, fx_coverage = load_fx_rates(currencies, 'EUR', start_date, today + timedelta(days=1), price_source, settled_through)
 
-        # Apply FX rates to stock prices
-        for currency, tickers in currency_ticker_map.items():
-            fx_rate = fx_rates_by_currency.get(currency)
-            if fx_rate is None:
-                continue
-            for ticker in tickers:
-                prices = yf_stock_price_data.get(ticker, {})
-                for date, price in prices.items():
-                    prices[date] = price * fx_rate.get(date, 1)
+        # Convert all prices at once with an as-of join on the FX rates
+        prices_df = convert_prices(prices_df, ticker_currency_dict, fx_rates_df, 'EUR')
 
         # Load existing portfolio performance from DB
         try:
             portfolio_results_df = load_portfolio_performance_from_db()
-            portfolio_results_df["start_date"] = pd.to_datetime(portfolio_results_df["start_date"], format='%d-%m-%Y', errors='coerce').dt.date
-            portfolio_results_df["end_date"] = pd.to_datetime(portfolio_results_df["end_date"], format='%d-%m-%Y', errors='coerce').dt.date
+            portfolio_results_df["start_date"] = portfolio_results_df["start_date"].dt.date
+            portfolio_results_df["end_date"] = portfolio_results_df["end_date"].dt.date
             if portfolio_results_df.empty:
                 raise ValueError("Empty portfolio data from DB")
             app_logger.info("[PORTFOLIO-CALC] Loaded portfolio_performance_daily from DB")
 
-            # Remove last 3 days to force refresh (get end of day data)
-            last_3_days = sorted(portfolio_results_df['end_date'].unique())[-3:]
-            portfolio_results_df = portfolio_results_df[~portfolio_results_df['end_date'].isin(last_3_days)]
-
         except Exception as e:
             app_logger.warning(f"[PORTFOLIO-CALC] Failed to load portfolio_performance_daily from DB: {e}")
             portfolio_results_df = pd.DataFrame(columns=['product', 'ticker', 'quantity', 'start_date', 'end_date', 
@@ -126,101 +228,123 @@ def calc_portfolio():
                                                             'net_return', 'current_performance_percentage', 
                                                             'net_performance_percentage'])
 
-        # Load stock prices from DB
-        try:
-            stock_prices_df = load_stock_prices_from_db()
-            stock_prices_df["date"] = pd.to_datetime(stock_prices_df["date"], format='%d-%m-%Y', errors='coerce').dt.date
-            if stock_prices_df.empty:
-                raise ValueError("Empty stock prices data from DB")
-            stock_prices_df = stock_prices_df.dropna(subset=['price'])
-            stock_prices_dict = stock_prices_df.groupby('ticker').apply(lambda x: x.set_index('date')['price'].to_dict()).to_dict()
-            app_logger.info("[PORTFOLIO-CALC] Loaded stock_prices from DB")
-        except Exception as e:
-            app_logger.warning(f"[PORTFOLIO-CALC] Failed to load stock_prices from DB: {e}")
-            stock_prices_dict = {}
-
-        # Append fresh stock price data to stock_prices_dict
-        for ticker, prices in yf_stock_price_data.items():
-            if ticker in stock_prices_dict:
-                stock_prices_dict[ticker].update(prices)
-            else:
-                stock_prices_dict[ticker] = prices
-
-        # Remove duplicates from stock_prices_dict
-        for ticker in stock_prices_dict:
-            stock_prices_dict[ticker] = {date: price for date, price in sorted(stock_prices_dict[ticker].items())}
-
-        # Loop over each end date, calculate portfolio results, and add to the list
-        for end_date in end_dates:
-            # Try to get end_date data, else continue
-            try:
-                # Skip weekends (Saturday and Sunday)
-                if end_date.weekday() >= 5:
-                    continue  # Skip this iteration if it's a weekend
-                
-                # Check if the result for this end date already exists in the DataFrame
-                if not portfolio_results_df[portfolio_results_df['end_date'] == end_date].empty:
-                    continue  # Skip if already present
-
-                app_logger.info(f"[PORTFOLIO-CALC] Retrieving data for: {end_date.isoformat()}")
-
-                # Ensure that the transactions before the end date are not empty
-                transactions_before_end = transactions[transactions["Date"] <= end_date]
-
-                if transactions_before_end.empty:
-                    app_logger.info(f"[PORTFOLIO-CALC] No transactions found for date: {end_date.isoformat()}. Skipping...")
-                    continue
-
-                stock_list = list(transactions_before_end["Stock"].unique())
-                
-                # Retrieve stock results using analyzer class
-                result = analyzer.calculate_all_stocks_mwr(
-                    start_date=start_date, 
-                    end_date=end_date, 
-                    stocks=stock_list,
-                    stock_prices=stock_prices_dict
-                )
-                
-                for key in result:
-                    portfolio_data = result.get(key)
-                    
-                    # Check if portfolio_data is valid before proceeding
-                    if portfolio_data is None or not isinstance(portfolio_data, dict):
-                        app_logger.warning(f"[PORTFOLIO-CALC] Stock data is missing or invalid for date: {end_date.isoformat()}. Result: {result}")
-                        continue
-                    
-                    # Ensure end_date is included in the portfolio_data
-                    portfolio_data['end_date'] = end_date
-                    
-                    # Append the new data to the list
-                    portfolio_results_list.append(portfolio_data)
-
-            except Exception as e:
-                app_logger.warning(f"[PORTFOLIO-CALC] Failed to retrieve daily data for {end_date}: {e}")
-                continue
+        # Rows as stored in the DB, only rows that differ from them are saved
+        stored_results_df = portfolio_results_df
+
+        # Rows after a ticker's watermark were calculated with provisional prices and are refreshed.
+        # Tickers without a watermark yet fall back to refreshing the last 3 stored days.
+        refresh_from = {}
+        if not portfolio_results_df.empty:
+            stored_end_dates = sorted(portfolio_results_df['end_date'].unique())
+            fallback_refresh_from = stored_end_dates[-3] if len(stored_end_dates) >= 3 else stored_end_dates[0]
+            refresh_from = {
+                ticker: price_watermarks[ticker] + timedelta(days=1) if ticker in price_watermarks
+                else start_date if ticker in stale_tickers else fallback_refresh_from
+                for ticker in stock_list
+            }
+
+        # Tickers whose transactions changed since the last calculation are refreshed from the earliest change
+        for ticker, changed_date in changed_tickers.items():
+            refresh_from[ticker] = min(refresh_from.get(ticker, changed_date), changed_date)
+
+        # Dirty range: drop the stored rows that need to be recalculated
+        dirty_end_dates = []
+        deleted_from = {}
+        if refresh_from and not portfolio_results_df.empty:
+            dirty_start = min(refresh_from.values())
+            if changed_tickers:
+                app_logger.info(f"[PORTFOLIO-CALC] Transactions changed for {sorted(changed_tickers)}, recalculating from {min(changed_tickers.values()).isoformat()}")
+            app_logger.info(f"[PORTFOLIO-CALC] Refreshing provisional and changed rows from {dirty_start.isoformat()}")
+
+            stale_rows = [
+                (ticker in refresh_from and end_date >= refresh_from[ticker]) or (ticker == 'FULL' and end_date >= dirty_start)
+                for ticker, end_date in zip(portfolio_results_df['ticker'], portfolio_results_df['end_date'])
+            ]
+            portfolio_results_df = portfolio_results_df[~pd.Series(stale_rows, index=portfolio_results_df.index, dtype=bool)]
+            if changed_tickers:
+                # Stored rows of changed tickers are deleted when the recalculated rows are saved (same transaction)
+                deleted_from = {**changed_tickers, 'FULL': min(changed_tickers.values())}
+                deleted_rows = [
+                    ticker in deleted_from and end_date >= deleted_from[ticker]
+                    for ticker, end_date in zip(stored_results_df['ticker'], stored_results_df['end_date'])
+                ]
+                stored_results_df = stored_results_df[~pd.Series(deleted_rows, index=stored_results_df.index, dtype=bool)]
+
+            # Dates that still have stored rows of other tickers only need the refreshed tickers and the totals
+            dirty_end_dates = sorted(end_date for end_date in set(portfolio_results_df['end_date']) if end_date >= dirty_start)
+
+        # Position snapshots from the first changed transaction onwards no longer match the ledger
+        if changed_tickers:
+            delete_position_snapshots_from_dates(changed_tickers)
+
+        # Compact sorted price series per ticker for the calculation (NaNs dropped once)
+        price_series_dict = {ticker: PriceSeries.empty() for ticker in stock_list}
+        for ticker, ticker_prices in prices_df.groupby('ticker', sort=False):
+            price_series_dict[ticker] = PriceSeries.from_arrays(ticker_prices['date'].to_numpy(), ticker_prices['price'].to_numpy())
+
+        # Collect the end dates that still need to be calculated
+        existing_end_dates = set(portfolio_results_df['end_date'])
+        missing_end_dates = [
+            end_date for end_date in end_dates
+            if end_date.weekday() < 5  # Skip weekends (Saturday and Sunday)
+            and end_date not in existing_end_dates  # Skip if already present
+        ]
+
+        if missing_end_dates:
+            app_logger.info(f"[PORTFOLIO-CALC] Calculating {len(missing_end_dates)} days from {missing_end_dates[0].isoformat()} to {missing_end_dates[-1].isoformat()}")
+
+        # Calculate all missing dates at once over a (day x stock) matrix
+        new_portfolio_results_df, new_snapshots_df = analyzer.calculate_daily_performance(
+            stocks=stock_list,
+            start_date=start_date,
+            end_dates=missing_end_dates,
+            stock_prices=price_series_dict,
+            workers=CALC_WORKERS if CALC_PARALLEL else 1,
+            snapshots=load_resume_snapshots(missing_end_dates)
+        )
+
+        # Recalculate the changed tickers over the dirty range and rebuild the full portfolio rows
+        if dirty_end_dates:
+            dirty_stocks = [stock for stock in stock_list if stock in refresh_from and refresh_from[stock] <= dirty_end_dates[-1]]
+            app_logger.info(f"[PORTFOLIO-CALC] Recalculating {len(dirty_stocks)} ticker(s) for {len(dirty_end_dates)} stored days")
+
+            dirty_results_df, dirty_snapshots_df = analyzer.calculate_daily_performance(
+                stocks=dirty_stocks,
+                start_date=start_date,
+                end_dates=dirty_end_dates,
+                stock_prices=price_series_dict,
+                workers=CALC_WORKERS if CALC_PARALLEL else 1,
+                include_portfolio=False,
+                snapshots=load_resume_snapshots(dirty_end_dates)
+            )
+            # Keep the stored rows before each ticker's own refresh date
+            refreshed_rows = [
+                end_date >= refresh_from[ticker]
+                for ticker, end_date in zip(dirty_results_df['ticker'], dirty_results_df['end_date'])
+            ]
+            dirty_results_df = dirty_results_df[pd.Series(refreshed_rows, index=dirty_results_df.index, dtype=bool)]
+            span_stock_rows = pd.concat([
+                portfolio_results_df[portfolio_results_df['end_date'].isin(dirty_end_dates)],
+                dirty_results_df
+            ], ignore_index=True)
+            dirty_portfolio_rows = calculate_portfolio_rows_from_stock_rows(span_stock_rows, start_date)
+
+            new_portfolio_results_df = pd.concat(
+                [df for df in (new_portfolio_results_df, dirty_results_df, dirty_portfolio_rows) if not df.empty],
+                ignore_index=True
+            )
+            new_snapshots_df = pd.concat([new_snapshots_df, dirty_snapshots_df], ignore_index=True)
 
-        # Combine the list into a DataFrame if there are new results
-        if portfolio_results_list:
-            new_portfolio_results_df = pd.DataFrame(portfolio_results_list)
-            # Append new results to the existing DataFrame
+        # Append new results to the existing DataFrame
+        if not new_portfolio_results_df.empty:
             portfolio_results_df = pd.concat([portfolio_results_df, new_portfolio_results_df], ignore_index=True)
 
         # Save the updated DataFrame to db
         portfolio_results_df = portfolio_results_df.dropna()
         portfolio_results_df['quantity'] = portfolio_results_df['quantity'].astype(int)
 
-        # Update product column based on ISIN mapping json
-        with open('output/isin_mapping.json', 'r') as f:
-            isin_mapping = json.load(f)
-
-        # Build a reverse map: ticker -> display_name
-        ticker_to_name = {
-            data.get("ticker"): data.get("display_name", "")
-            for data in isin_mapping.values()
-            if "ticker" in data
-        }
-
-        portfolio_results_df['product'] = portfolio_results_df['ticker'].map(ticker_to_name).fillna('')
+        # Update product column based on ISIN mapping
+        portfolio_results_df['product'] = portfolio_results_df['ticker'].map(get_ticker_to_name()).fillna('')
 
         # Ensure no rows with missing tickers
         portfolio_results_df = portfolio_results_df.dropna(subset=['ticker'])
@@ -229,41 +353,54 @@ def calc_portfolio():
             app_logger.warning("[PORTFOLIO-CALC] No valid portfolio rows to save to DB.")
 
         # Daily table
-        # Save updated daily portfolio performance to database (upsert)
+        # Save the new and changed daily portfolio performance rows to database (upsert)
         db_save_start = time.time()
-        save_portfolio_performance_to_db(portfolio_results_df)
+        changed_results_df = get_changed_rows(portfolio_results_df, stored_results_df, ['ticker', 'end_date'])
+        inserted, updated, skipped = save_portfolio_performance_to_db(changed_results_df, delete_from=deleted_from)
         db_save_end = time.time()
-        app_logger.info(f"[PORTFOLIO-CALC] Saving portfolio performance to DB took {round(db_save_end - db_save_start, 2)} seconds.")
-
-        # Stock prices
-        stock_prices_records = []
-        for ticker, date_prices in stock_prices_dict.items():
-            currency = ticker_currency_dict.get(ticker, 'EUR')  # Default EUR if missing
-            fx_rate_data = fx_rates_by_currency.get(currency, {}) if currency != 'EUR' else {}
-
-            currency_pair = f"{currency}-EUR" if currency != 'EUR' else "EUR-EUR"
-
-            for date, price in date_prices.items():
-                # FX rate for the date if not EUR, else 1
-                fx_rate = fx_rate_data.get(date, 1) if currency != 'EUR' else 1
-
-                stock_prices_records.append({
-                    "ticker": ticker,
-                    "date": date,
-                    "price": price if price is not None else 0,
-                    "fx_rate": fx_rate,
-                    "currency_pair": currency_pair
-                })
-
-        stock_prices_df = pd.DataFrame(stock_prices_records)
+        app_logger.info(
+            f"[PORTFOLIO-CALC] Saved portfolio performance to DB: {inserted} inserted, {updated} updated, "
+            f"{skipped + len(portfolio_results_df) - len(changed_results_df)} skipped ({round(db_save_end - db_save_start, 2)}s)"
+        )
+        data_changed = inserted + updated > 0
+
+        # Position snapshots of the ledger states walked in this run
+        new_snapshots_df = new_snapshots_df.drop_duplicates(subset=['ticker', 'date'], keep='last')
+        inserted, updated, skipped = save_position_snapshots_to_db(new_snapshots_df)
+        app_logger.info(f"[PORTFOLIO-CALC] Saved position snapshots to DB: {inserted} inserted, {updated} updated, {skipped} skipped")
+
+        # Stock prices after the watermarks, stored prices before them are final
+        refresh_dates = pd.to_datetime(prices_df['ticker'].map(price_refresh_from).fillna(start_date))
+        stock_prices_df = prices_df.loc[prices_df['date'] >= refresh_dates, ["ticker", "date", "price", "fx_rate", "currency_pair"]]
+        stock_prices_df['date'] = stock_prices_df['date'].dt.date
         stock_prices_df = stock_prices_df.dropna(subset=['price'])
-        db_save_start = time.time()
-        save_stock_prices_to_db(stock_prices_df)
-        db_save_end = time.time()
-        app_logger.info(f"[PORTFOLIO-CALC] Saving stock prices to DB took {round(db_save_end - db_save_start, 2)} seconds.")
+        if not stock_prices_df.empty:
+            db_save_start = time.time()
+            inserted, updated, skipped = save_stock_prices_to_db(stock_prices_df)
+            db_save_end = time.time()
+            app_logger.info(f"[PORTFOLIO-CALC] Saved stock prices to DB: {inserted} inserted, {updated} updated, {skipped} skipped ({round(db_save_end - db_save_start, 2)}s)")
+            data_changed = data_changed or inserted + updated > 0
+
+        # Summary for the metadata endpoint, the data version increases when stored data changed
+        save_portfolio_metadata(
+            products=sorted(product for product in portfolio_results_df['product'].unique() if product is not None),
+            min_date=portfolio_results_df['end_date'].min() if not portfolio_results_df.empty else None,
+            max_date=portfolio_results_df['end_date'].max() if not portfolio_results_df.empty else None,
+            data_changed=data_changed
+        )
 
         app_logger.info("[PORTFOLIO-CALC] Data saved to DB.")
 
+        # Days the source answered for are final, the next run only refreshes the days after
+        finalized = get_finalized_watermarks(
+            stock_list, price_cache, prices_df, price_watermarks, start_date, settled_through, ticker_currency_dict, fx_coverage
+        )
+        save_price_watermarks(finalized, refreshed=[ticker for ticker in full_refresh_tickers if ticker in finalized])
+        app_logger.info(f"[PORTFOLIO-CALC] Prices finalized up to {settled_through.isoformat()} for {len(finalized)}/{len(stock_list)} tickers")
+
+        # Remember which transactions the stored data was calculated from
+        save_transaction_fingerprints(transaction_fingerprints)
+
         # End timing
         end_time = time.time()
         app_logger.info(f"[PORTFOLIO-CALC] Execution time: {round(end_time - start_time, 2)} seconds")
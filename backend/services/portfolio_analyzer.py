@@ -1,212 +1,116 @@
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, date, timezone, timedelta
-import json
 import warnings
+from backend.services.position_ledger import PositionLedger
+from backend.services.portfolio_matrix import calculate_portfolio_matrix
+from backend.services.transaction_index import build_transaction_index
+from backend.services.price_series import as_price_series
+from backend.services.price_provider import get_price_provider
+from backend.utils.isin_mapping import get_ticker_to_name
 
 warnings.simplefilter(action='ignore', category=pd.errors.SettingWithCopyWarning)
 
 class PortfolioAnalyzer:
-    def __init__(self, transactions):
-        """Initialize with transaction data (pandas DataFrame)."""
+    def __init__(self, transactions, price_provider=None):
+        """Initialize with transaction data (pandas DataFrame) and an optional PriceProvider."""
         self.transactions = transactions
+        self.price_provider = price_provider or get_price_provider()
         self.transactions["Date"] = pd.to_datetime(self.transactions["Date"]).dt.date
 
-    def get_price_at_date(self, tickers, start, end):
+        # Immutable per-ticker index of date-sorted transaction arrays
+        self.transaction_index = build_transaction_index(self.transactions)
+
+    def get_ticker_transactions(self, stock, end_date=None):
         """
-        Fetch daily closing prices for given tickers.
-        Only add +1 day to `end` if end is today (to ensure Yahoo returns latest data).
+        Return the TickerTransactions of a stock, optionally only up to end_date (inclusive).
+        Returns None if the stock has no transactions.
         """
-        # Download stock data
-        stock_data = yf.download(tickers, start=start, end=end, interval="1d")["Close"]
+        ticker_transactions = self.transaction_index.get(stock)
+        if ticker_transactions is None or end_date is None:
+            return ticker_transactions
+        return ticker_transactions.upto(end_date)
 
-        # Convert timestamps to date strings
-        if isinstance(stock_data, pd.Series):  # Single stock case
-            stock_prices_dates = {date.date(): price for date, price in stock_data.items()}
-        else:  # Multiple stocks case
-            stock_prices_dates = {
-                stock: {date.date(): price for date, price in prices.items()}
-                for stock, prices in stock_data.to_dict().items()
-            }
-        return stock_prices_dates
+    def get_price_at_date(self, tickers, start, end):
+        """
+        Fetch daily closing prices for given tickers from the price provider.
+        Returns {ticker: {date: price}}.
+        """
+        return self.price_provider.get_prices(list(tickers), start, end)
 
     def get_first_last_open_day(self, start_date, end_date, stock_price_data, first=True):
-        # """Fetches the first or last open market day within a given date range using stock_price_data."""
-
-        # # Filter stock_price_data for the given date range
-        # stock_prices = stock_price_data
-        # #today = datetime.now(timezone.utc).date()
-
-        # effective_today = self.effective_market_date_utc()
-
-        # if end_date == effective_today:
-        #     filtered_dates = [d for d in stock_prices.keys() if start_date <= d <= end_date]
-        # else:
-        #     filtered_dates = [d for d in stock_prices.keys() if start_date <= d < end_date]
-
-        # if not filtered_dates:
-        #     return start_date if first else end_date
-
-        # # Return the first or last open market day
-        # return min(filtered_dates) if first else max(filtered_dates)
-    
         """
         Fetches the first or last open market day within a given date range using stock_price_data.
-
+        stock_price_data is a PriceSeries or a {date: price} dict; lookups are binary searches.
         """
-        available_dates = [d for d in stock_price_data.keys() if start_date <= d <= end_date]
+        price_series = as_price_series(stock_price_data)
+
+        if first:
+            open_day = price_series.date_on_or_after(start_date, not_after=end_date)
+        else:
+            open_day = price_series.date_on_or_before(end_date, not_before=start_date)
 
-        if not available_dates:
+        if open_day is None:
             return start_date if first else end_date
 
-        return min(available_dates) if first else max(available_dates)
+        return open_day
 
     def get_fx_rate(self, first_currency, second_currency, start, end):
-        """Fetch FX rate data as { 'YYYY-MM-DD': rate }."""
-
-        ticker = f"{first_currency}{second_currency}=X"
-        print(f"Fetching fx rates: {ticker}")
-
-        data = yf.download(ticker, start=start, end=end, interval='1d')
-
-        if data.empty:
-            print("Downloaded fx rates data is empty.")
-            return {}
-
-        try:
-        # If data has MultiIndex columns (which happens when only one ticker is used)
-            if isinstance(data.columns, pd.MultiIndex):
-                close_series = data["Close"][ticker]  # Extract the actual Series
-            else:
-                close_series = data["Close"]  # Just in case it's flat
-        except:
-            print("Error extracting 'Close' data from downloaded fx rates.")
-            return {}
-
-        # Build date string: rate dictionary
-        fx_rates = {
-            pd.to_datetime(date).date():  price
-            for date, price in close_series.items()
-        }
+        """Fetch FX rate data as {date: rate}."""
+        return self.get_fx_rates([first_currency], second_currency, start, end)[first_currency]
 
-        return fx_rates
+    def get_fx_rates(self, currencies, second_currency, start, end):
+        """Fetch the FX rates of several currencies in one (concurrent) request as {currency: {date: rate}}."""
+        return self.price_provider.get_fx_rates(list(currencies), second_currency, start, end)
 
     def calculate_mwr(self, stock, start_date, end_date, stock_price_data=None):
-        """Calculate Money Weighted Return using individual performance tracking for each transaction."""
-        
-        # Delete 'nan' values in stock_price_data
-        stock_price_data = {k: v for k, v in stock_price_data.items() if v == v}
-
-        # Filter transactions within the date range
-        period_transactions = self.transactions[
-            (self.transactions["Date"] >= start_date) &
-            (self.transactions["Date"] <= end_date) &
-            (self.transactions['Stock'] == stock)]
+        """
+        Calculate Money Weighted Return using individual performance tracking for each transaction.
+        Realized returns use the running BUY totals of a PositionLedger, so each transaction costs O(1).
+        """
         
-        previous_transactions = self.transactions[
-            (self.transactions["Date"] < start_date) &
-            (self.transactions['Stock'] == stock)]
-
-        all_transactions = pd.concat([previous_transactions, period_transactions], ignore_index=True)
+        # Prices without 'nan' values
+        price_series = as_price_series(stock_price_data)
 
-        # Sort transactions by date and time
-        all_transactions.sort_values(by=["Date", "Time"], inplace=True)
+        # All transactions of the stock up to end_date
+        all_transactions = self.get_ticker_transactions(stock, end_date)
 
-        # Load ISIN mapping from JSON
-        with open('output/isin_mapping.json', 'r') as f:
-            isin_mapping = json.load(f)
-
-        # Build a reverse map: ticker -> display_name
-        ticker_to_name = {
-            data.get("ticker"): data.get("display_name", "")
-            for data in isin_mapping.values()
-            if "ticker" in data
-        }
-
-        product = ticker_to_name.get(stock, "")
+        product = get_ticker_to_name().get(stock, "")
         
-        # Average cost
-        if not all_transactions.empty:
-            buys = all_transactions[all_transactions['Action'] == 'BUY']
-            quantity_bought = buys['Quantity'].sum()
-            avg_cost = -1 * (buys['Cost'].sum() / quantity_bought) if quantity_bought > 0 else 0
-
-        # Initialize variables to track
-        realized_return = 0
-        quantity_held = 0
-        purchase_cost = 0
-        transaction_costs_total = 0
-
-        # Track each transaction
-        for _, row in all_transactions.iterrows():
-            action, row_stock, quantity, transaction_costs = row["Action"], row["Stock"], row["Quantity"], row['Transaction_costs']
-            transaction_price = abs(row["Cost"])/abs(row["Quantity"])
-
-            transaction_value = quantity * transaction_price
-            
-            if action == "BUY":
-                # Update total investment and average purchase cost
-                purchase_cost += transaction_value
-                quantity_held += quantity
-                realized_return += transaction_costs
-                transaction_costs_total += -1 * transaction_costs
-
-            elif action == "SELL":
-                # Calculate realized return based on average purchase cost
-                if quantity_held > 0:
-                    stock_transactions = all_transactions[all_transactions['Stock']==row_stock]
-                    avg_cost_stock = -1 * (stock_transactions[stock_transactions['Action'].isin(['BUY'])]['Cost'].sum() / stock_transactions[stock_transactions['Action'].isin(['BUY'])]['Quantity'].sum())
-                    transaction_costs_total += -1 * transaction_costs
+        # Walk the transactions once, carrying running BUY totals in the ledger
+        ledger = PositionLedger()
+        if all_transactions is not None:
+            for action, quantity, cost, transaction_costs in all_transactions.rows():
+                ledger.apply(action, quantity, cost, transaction_costs)
 
-                    quantity_held -= abs(quantity)
-                    
-                    # Calculate gain or loss
-                    realized_return += abs(quantity) * (transaction_price - avg_cost_stock) + transaction_costs
+        # Price for the remaining holdings
+        end_price = None
+        if ledger.quantity_held > 0:
+            # Last available price within the range (corrected for market open days)
+            end_price = price_series.price_on_or_before(end_date, not_before=start_date)
 
-        # Calculate current return for remaining holdings
-        if quantity_held > 0:
-            # Corrected end_date for market open
-            end_date_cor = self.get_first_last_open_day(start_date, end_date, stock_price_data, first=False)
-            
-            # Get stock price from pre-fetched data
-            end_price = stock_price_data.get(end_date_cor, 0)
+        return ledger.metrics(product, stock, start_date, end_date, end_price)
 
-            if end_price is None:
-                end_price = 0
-
-            current_return = (quantity_held*end_price) - (quantity_held*avg_cost)
-        else:
-            current_return = 0
-
-        # Cost basis
-        cost_basis = quantity_held*avg_cost
-
-        # Net return and current value of the stock
-        net_return = current_return + realized_return
-        current_value = (quantity_held*avg_cost) + current_return
-        
-        # Performance percentages
-        current_performance_percentage = ((current_return) / cost_basis) * 100 if (current_return and cost_basis) else 0
-        net_performance_percentage = ((current_return + realized_return) / purchase_cost) * 100 if purchase_cost else 0
+    def calculate_daily_performance(self, stocks, start_date, end_dates, stock_prices, workers=1, include_portfolio=True, snapshots=None):
+        """
+        Calculate the daily rows of all stocks and the full portfolio for every date in end_dates.
+        Vectorized over a (day x stock) matrix, see portfolio_matrix.calculate_portfolio_matrix.
+        With workers > 1 the stocks are calculated in parallel processes.
+        With include_portfolio=False the full portfolio rows are left out.
+        snapshots ({ticker: (date, state)}) resumes tickers from stored position snapshots.
+        Returns (DataFrame with the portfolio_performance_daily columns, new position snapshot rows).
+        """
+        return calculate_portfolio_matrix(
+            transaction_index=self.transaction_index,
+            stocks=list(stocks),
+            start_date=start_date,
+            end_dates=end_dates,
+            stock_prices=stock_prices,
+            ticker_to_name=get_ticker_to_name(),
+            workers=workers,
+            include_portfolio=include_portfolio,
+            snapshots=snapshots
+        )
 
-        return {
-            "product": product,
-            "ticker": stock,
-            "quantity": int(quantity_held),
-            "start_date": start_date,
-            "end_date": end_date,
-            "avg_cost": round(avg_cost, 2),
-            "cost_basis": round(cost_basis, 2),
-            "total_cost": round(purchase_cost, 2),
-            "transaction_costs": round(transaction_costs_total, 2),
-            "current_value": round(current_value, 2),
-            "current_money_weighted_return": round(current_return, 2),
-            "realized_return": round(realized_return, 2),
-            "net_return": round(net_return, 2),
-            "current_performance_percentage": round(current_performance_percentage, 2),
-            "net_performance_percentage": round(net_performance_percentage, 2)
-        }
-    
     def calculate_total_portfolio_performance(self, start_date, end_date, stock_results):
 
         # Initialize accumulators for the metrics
@@ -0,0 +1,347 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from backend.services.position_ledger import PositionLedger, LEDGER_STATE_FIELDS
+from backend.services.price_series import as_price_series
+from backend.utils.logger import app_logger
+
+# Column order of the portfolio_performance_daily rows
+RESULT_COLUMNS = [
+    'product', 'ticker', 'quantity', 'start_date', 'end_date',
+    'avg_cost', 'cost_basis', 'total_cost', 'transaction_costs', 'current_value',
+    'current_money_weighted_return', 'realized_return',
+    'net_return', 'current_performance_percentage',
+    'net_performance_percentage'
+]
+
+# Below this many (day x stock) cells the process pool start-up costs more than it saves
+PARALLEL_MIN_CELLS = 250_000
+
+# Metrics summed across tickers for the "Full portfolio" row
+SUMMED_METRICS = [
+    'cost_basis', 'total_cost', 'transaction_costs', 'current_value',
+    'current_money_weighted_return', 'realized_return', 'net_return'
+]
+
+# Columns of the position_snapshots rows
+SNAPSHOT_COLUMNS = ['ticker', 'date', *LEDGER_STATE_FIELDS, 'realized_return']
+
+def build_state_matrices(transaction_index, stocks, days, snapshots=None):
+    """
+    Build (day x stock) matrices of the carried PositionLedger state.
+
+    Each stock's TickerTransactions from the transaction index are walked once to
+    record the ledger state after every transaction; the state for each day is then
+    picked with a binary search on the transaction dates.
+
+    snapshots optionally holds a stored {stock: (date, state)} ledger snapshot per stock.
+    A snapshot on or before the first day is used as the starting state, so only the
+    transactions after the snapshot date are walked.
+
+    Returns ({field: matrix}, traded_mask, snapshot_rows) where traded_mask marks the
+    cells that have at least one transaction on or before the day and snapshot_rows
+    holds the ledger state at the end of every walked transaction date.
+    """
+    if snapshots is None:
+        snapshots = {}
+
+    n_days, n_stocks = len(days), len(stocks)
+    state = {field: np.zeros((n_days, n_stocks)) for field in LEDGER_STATE_FIELDS}
+    traded = np.zeros((n_days, n_stocks), dtype=bool)
+    snapshot_frames = []
+
+    for col, stock in enumerate(stocks):
+        stock_transactions = transaction_index.get(stock)
+        if stock_transactions is None or not len(stock_transactions):
+            continue
+
+        snapshot = snapshots.get(stock)
+        if snapshot is not None and n_days and np.datetime64(snapshot[0], "D") <= days[0]:
+            # Resume from the snapshot, only walk the later transactions
+            snapshot_day = np.datetime64(snapshot[0], "D")
+            ledger = PositionLedger.from_state(snapshot[1])
+            stock_transactions = stock_transactions.after(snapshot_day)
+            history = [ledger.state()]
+            history_dates = np.concatenate([[snapshot_day], stock_transactions.dates])
+        else:
+            ledger = PositionLedger()
+            history = []
+            history_dates = stock_transactions.dates
+        walked_from = len(history)
+
+        # Ledger state after each transaction
+        for action, quantity, cost, transaction_costs in stock_transactions.rows():
+            ledger.apply(action, quantity, cost, transaction_costs)
+            history.append(ledger.state())
+        history = np.array(history, dtype=float)
+
+        # Index of the last transaction on or before each day
+        idx = np.searchsorted(history_dates, days, side="right") - 1
+        has_state = idx >= 0
+
+        traded[:, col] = has_state
+        for field_idx, field in enumerate(LEDGER_STATE_FIELDS):
+            state[field][has_state, col] = history[idx[has_state], field_idx]
+
+        if len(stock_transactions):
+            snapshot_frames.append(
+                build_snapshot_rows(stock, stock_transactions.dates, history[walked_from:])
+            )
+
+    if snapshot_frames:
+        snapshot_rows = pd.concat(snapshot_frames, ignore_index=True)
+    else:
+        snapshot_rows = pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    return state, traded, snapshot_rows
+
+def build_snapshot_rows(stock, dates, history):
+    """Position snapshot rows with the ledger state at the end of each transaction date."""
+    last_of_day = np.append(dates[1:] != dates[:-1], True)
+    history = history[last_of_day]
+    state = {field: history[:, field_idx] for field_idx, field in enumerate(LEDGER_STATE_FIELDS)}
+    _, realized_return = compute_avg_cost_and_realized_return(state)
+    return pd.DataFrame({
+        "ticker": stock,
+        "date": dates[last_of_day].astype(object),
+        **state,
+        "realized_return": realized_return,
+    })[SNAPSHOT_COLUMNS]
+
+def compute_avg_cost_and_realized_return(state):
+    """Unrounded average BUY cost and realized return of (arrays of) ledger state."""
+    buy_quantity = state["buy_quantity"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_cost = np.where(buy_quantity > 0, state["buy_cost"] / buy_quantity, 0)
+    realized_return = state["fees"] + state["sell_value"] - state["sell_quantity"] * avg_cost
+    return avg_cost, realized_return
+
+def build_price_matrix(stock_prices, stocks, days, start_date):
+    """
+    Build a (day x stock) matrix of the last available price on or before each day.
+    stock_prices holds a PriceSeries (or {date: price} dict) per stock.
+    Prices before start_date are ignored; cells without any price are NaN.
+    """
+    price = np.full((len(days), len(stocks)), np.nan)
+    for col, stock in enumerate(stocks):
+        price_series = as_price_series(stock_prices.get(stock))
+        price[:, col] = price_series.prices_on_or_before(days, not_before=start_date)
+    return price
+
+def compute_metric_matrices(state, price):
+    """
+    Compute the calculate_mwr metrics as whole-array operations.
+    Returns {column: matrix}, rounded to 2 decimals like calculate_mwr.
+    """
+    quantity_held = state["quantity_held"]
+    purchase_cost = state["purchase_cost"]
+    avg_cost, realized_return = compute_avg_cost_and_realized_return(state)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        end_price = np.nan_to_num(price, nan=0.0)
+        current_return = np.where(quantity_held > 0, (quantity_held*end_price) - (quantity_held*avg_cost), 0)
+
+        cost_basis = quantity_held*avg_cost
+        net_return = current_return + realized_return
+        current_value = (quantity_held*avg_cost) + current_return
+
+        current_performance_percentage = np.where(
+            (current_return != 0) & (cost_basis != 0), ((current_return) / cost_basis) * 100, 0
+        )
+        net_performance_percentage = np.where(
+            purchase_cost != 0, ((current_return + realized_return) / purchase_cost) * 100, 0
+        )
+
+    return {
+        "quantity": quantity_held.astype(int),
+        "avg_cost": np.round(avg_cost, 2),
+        "cost_basis": np.round(cost_basis, 2),
+        "total_cost": np.round(purchase_cost, 2),
+        "transaction_costs": np.round(-1 * state["fees"], 2),
+        "current_value": np.round(current_value, 2),
+        "current_money_weighted_return": np.round(current_return, 2),
+        "realized_return": np.round(realized_return, 2),
+        "net_return": np.round(net_return, 2),
+        "current_performance_percentage": np.round(current_performance_percentage, 2),
+        "net_performance_percentage": np.round(net_performance_percentage, 2),
+    }
+
+def compute_portfolio_totals(metrics, traded):
+    """
+    Compute the "Full portfolio" metrics per day as row-sums across the stock matrices.
+    Same aggregation as PortfolioAnalyzer.calculate_total_portfolio_performance.
+    """
+    totals = {"quantity": np.where(traded, metrics["quantity"], 0).sum(axis=1)}
+    for column in SUMMED_METRICS:
+        totals[column] = np.where(traded, metrics[column], 0).sum(axis=1)
+
+    quantity = totals["quantity"]
+    purchase_cost = totals["total_cost"]
+    current_return = totals["current_money_weighted_return"]
+    cost_basis_total = totals["cost_basis"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_cost_port = np.where(quantity > 0, purchase_cost / quantity, 0)
+        current_performance_percentage = np.where(
+            (current_return != 0) & (cost_basis_total != 0), ((current_return) / cost_basis_total) * 100, 0
+        )
+        net_performance_percentage = np.where(
+            purchase_cost != 0, ((current_return + totals["realized_return"]) / purchase_cost) * 100, 0
+        )
+
+    totals["avg_cost"] = avg_cost_port
+    totals["current_performance_percentage"] = current_performance_percentage
+    totals["net_performance_percentage"] = net_performance_percentage
+
+    return {
+        column: (values.astype(int) if column == "quantity" else np.round(values, 2))
+        for column, values in totals.items()
+    }
+
+def calculate_stock_matrices(transaction_index, stocks, days, stock_prices, start_date, snapshots=None):
+    """
+    Calculate the (day x stock) metric matrices for the given stocks.
+    Returns ({column: matrix}, traded_mask, snapshot_rows).
+    """
+    state, traded, snapshot_rows = build_state_matrices(transaction_index, stocks, days, snapshots)
+    price = build_price_matrix(stock_prices, stocks, days, start_date)
+    return compute_metric_matrices(state, price), traded, snapshot_rows
+
+def _calculate_shard(shard_transactions, shard_stocks, days, shard_prices, start_date, shard_snapshots):
+    """Process pool entry point: metric matrices for one shard of stocks."""
+    shard_start = time.time()
+    metrics, traded, snapshot_rows = calculate_stock_matrices(
+        shard_transactions, shard_stocks, days, shard_prices, start_date, shard_snapshots
+    )
+    return metrics, traded, snapshot_rows, time.time() - shard_start
+
+def calculate_stock_matrices_parallel(transaction_index, stocks, days, stock_prices, start_date, workers, snapshots=None):
+    """
+    Calculate the metric matrices with the stocks sharded across a ProcessPoolExecutor.
+    Stocks are independent, so each worker only gets the transactions, EUR prices and
+    position snapshots of its own shard. The shard matrices are merged back in the
+    original stock order.
+    """
+    if snapshots is None:
+        snapshots = {}
+
+    n_shards = min(len(stocks), workers * 4)
+    shards = [list(shard) for shard in np.array_split(np.array(stocks, dtype=object), n_shards) if len(shard)]
+
+    # Spawn instead of fork: the API and scheduler threads are running in this process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [
+            executor.submit(
+                _calculate_shard,
+                {stock: transaction_index[stock] for stock in shard if stock in transaction_index},
+                shard,
+                days,
+                {stock: stock_prices.get(stock, {}) for stock in shard},
+                start_date,
+                {stock: snapshots[stock] for stock in shard if stock in snapshots},
+            )
+            for shard in shards
+        ]
+        results = [future.result() for future in futures]
+
+    shard_times = [shard_time for _, _, _, shard_time in results]
+    app_logger.info(f"[PORTFOLIO-CALC] Calculated {len(shards)} shards on {workers} workers (slowest shard {round(max(shard_times), 2)}s)")
+
+    metrics = {
+        column: np.concatenate([shard_metrics[column] for shard_metrics, _, _, _ in results], axis=1)
+        for column in results[0][0]
+    }
+    traded = np.concatenate([shard_traded for _, shard_traded, _, _ in results], axis=1)
+    snapshot_rows = pd.concat([shard_snapshots for _, _, shard_snapshots, _ in results], ignore_index=True)
+    return metrics, traded, snapshot_rows
+
+def calculate_portfolio_matrix(transaction_index, stocks, start_date, end_dates, stock_prices, ticker_to_name=None, workers=1, include_portfolio=True, snapshots=None):
+    """
+    Calculate the daily performance rows for all stocks and the full portfolio.
+
+    Builds dense (day x stock) matrices of quantity, cost basis, realized return and
+    forward-filled EUR price, computes all metrics as array operations and returns a
+    DataFrame with the portfolio_performance_daily columns.
+    With workers > 1, large calculations are sharded per stock across processes; the
+    full portfolio totals are always computed after merging the shards.
+    With include_portfolio=False only the stock rows are returned.
+    snapshots ({stock: (date, state)}) lets stocks resume from a stored ledger snapshot.
+    Returns (rows, snapshot_rows), see build_state_matrices for the snapshot rows.
+    """
+    if ticker_to_name is None:
+        ticker_to_name = {}
+
+    end_dates = sorted(end_dates)
+    if not end_dates or not stocks:
+        return pd.DataFrame(columns=RESULT_COLUMNS), pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+
+    days = np.array(end_dates, dtype="datetime64[D]")
+
+    if workers > 1 and len(stocks) > 1 and len(days) * len(stocks) >= PARALLEL_MIN_CELLS:
+        try:
+            metrics, traded, snapshot_rows = calculate_stock_matrices_parallel(
+                transaction_index, stocks, days, stock_prices, start_date, workers, snapshots
+            )
+        except Exception as e:
+            app_logger.warning(f"[PORTFOLIO-CALC] Parallel calculation failed, falling back to serial: {e}")
+            metrics, traded, snapshot_rows = calculate_stock_matrices(
+                transaction_index, stocks, days, stock_prices, start_date, snapshots
+            )
+    else:
+        metrics, traded, snapshot_rows = calculate_stock_matrices(
+            transaction_index, stocks, days, stock_prices, start_date, snapshots
+        )
+
+    # Stock rows for all traded (day, stock) cells
+    day_idx, stock_idx = np.nonzero(traded)
+    end_dates_array = np.array(end_dates, dtype=object)
+    stocks_array = np.array(stocks, dtype=object)
+    stock_rows = pd.DataFrame({
+        "product": [ticker_to_name.get(stock, "") for stock in stocks_array[stock_idx]],
+        "ticker": stocks_array[stock_idx],
+        "start_date": start_date,
+        "end_date": end_dates_array[day_idx],
+        **{column: values[day_idx, stock_idx] for column, values in metrics.items()},
+    })
+
+    if not include_portfolio:
+        return stock_rows[RESULT_COLUMNS], snapshot_rows
+
+    portfolio_rows = build_portfolio_rows(metrics, traded, end_dates_array, start_date)
+    return pd.concat([stock_rows, portfolio_rows], ignore_index=True)[RESULT_COLUMNS], snapshot_rows
+
+def build_portfolio_rows(metrics, traded, end_dates_array, start_date):
+    """Full portfolio rows for the days with at least one traded stock."""
+    totals = compute_portfolio_totals(metrics, traded)
+    has_data = traded.any(axis=1)
+    return pd.DataFrame({
+        "product": "Full portfolio",
+        "ticker": "FULL",
+        "start_date": start_date,
+        "end_date": end_dates_array[has_data],
+        **{column: values[has_data] for column, values in totals.items()},
+    })[RESULT_COLUMNS]
+
+def calculate_portfolio_rows_from_stock_rows(stock_rows, start_date):
+    """
+    Rebuild the Full portfolio rows from per-stock daily rows, e.g. stored rows of
+    unchanged stocks combined with freshly recalculated rows of changed stocks.
+    """
+    stock_rows = stock_rows[stock_rows['ticker'] != 'FULL']
+    if stock_rows.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    end_dates_array = np.array(sorted(stock_rows['end_date'].unique()), dtype=object)
+    metric_columns = ['quantity'] + SUMMED_METRICS
+
+    # (day x stock) matrices of the stored metrics
+    wide = stock_rows.pivot(index='end_date', columns='ticker', values=metric_columns).reindex(end_dates_array)
+    traded = wide['quantity'].notna().to_numpy()
+    metrics = {
+        column: wide[column].astype(float).fillna(0).to_numpy()
+        for column in metric_columns
+    }
+    metrics['quantity'] = metrics['quantity'].astype(int)
+
+    return build_portfolio_rows(metrics, traded, end_dates_array, start_date)
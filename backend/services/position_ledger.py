@@ -0,0 +1,117 @@
+# Carried state of a PositionLedger, in the order returned by PositionLedger.state()
+LEDGER_STATE_FIELDS = (
+    "quantity_held",
+    "purchase_cost",
+    "fees",
+    "buy_quantity",
+    "buy_cost",
+    "sell_quantity",
+    "sell_value",
+)
+
+class PositionLedger:
+    """
+    Running position state for a single ticker.
+
+    Transactions are applied once, in date/time order, and the metrics for any end
+    date are derived from the carried state. This gives the same results as replaying
+    the full transaction history in PortfolioAnalyzer.calculate_mwr for every day.
+    """
+
+    def __init__(self):
+        self.quantity_held = 0
+        self.purchase_cost = 0
+        self.fees = 0  # Transaction costs booked into the realized return (negative = paid)
+        self.buy_quantity = 0
+        self.buy_cost = 0
+        self.sell_quantity = 0
+        self.sell_value = 0
+
+    @classmethod
+    def from_state(cls, state):
+        """Restore a ledger from a state tuple ordered like LEDGER_STATE_FIELDS (e.g. a stored snapshot)."""
+        ledger = cls()
+        for field, value in zip(LEDGER_STATE_FIELDS, state):
+            setattr(ledger, field, value)
+        return ledger
+
+    def apply(self, action, quantity, cost, transaction_costs):
+        """Apply a single transaction to the running state."""
+        transaction_value = abs(cost)
+
+        if action == "BUY":
+            self.purchase_cost += transaction_value
+            self.quantity_held += quantity
+            self.buy_quantity += quantity
+            self.buy_cost += -1 * cost
+            self.fees += transaction_costs
+
+        elif action == "SELL":
+            # Sells without an open position are ignored, same as calculate_mwr
+            if self.quantity_held > 0:
+                self.quantity_held -= abs(quantity)
+                self.sell_quantity += abs(quantity)
+                self.sell_value += transaction_value
+                self.fees += transaction_costs
+
+    def state(self):
+        """Return the carried state as a tuple ordered like LEDGER_STATE_FIELDS."""
+        return tuple(getattr(self, field) for field in LEDGER_STATE_FIELDS)
+
+    @property
+    def avg_cost(self):
+        """Average BUY cost per unit over all buys applied so far."""
+        return self.buy_cost / self.buy_quantity if self.buy_quantity > 0 else 0
+
+    @property
+    def realized_return(self):
+        """
+        Realized return of all counted sells against the current average cost, plus fees.
+        Equivalent to summing abs(quantity) * (price - avg_cost) + costs per sell.
+        """
+        return self.fees + self.sell_value - self.sell_quantity * self.avg_cost
+
+    def metrics(self, product, stock, start_date, end_date, end_price=None):
+        """Build a result row with the same fields and rounding as calculate_mwr."""
+        quantity_held = self.quantity_held
+        avg_cost = self.avg_cost
+        realized_return = self.realized_return
+        purchase_cost = self.purchase_cost
+        transaction_costs_total = -1 * self.fees
+
+        # Calculate current return for remaining holdings
+        if quantity_held > 0:
+            if end_price is None:
+                end_price = 0
+            current_return = (quantity_held*end_price) - (quantity_held*avg_cost)
+        else:
+            current_return = 0
+
+        # Cost basis
+        cost_basis = quantity_held*avg_cost
+
+        # Net return and current value of the stock
+        net_return = current_return + realized_return
+        current_value = (quantity_held*avg_cost) + current_return
+
+        # Performance percentages
+        current_performance_percentage = ((current_return) / cost_basis) * 100 if (current_return and cost_basis) else 0
+        net_performance_percentage = ((current_return + realized_return) / purchase_cost) * 100 if purchase_cost else 0
+
+        return {
+            "product": product,
+            "ticker": stock,
+            "quantity": int(quantity_held),
+            "start_date": start_date,
+            "end_date": end_date,
+            "avg_cost": round(avg_cost, 2),
+            "cost_basis": round(cost_basis, 2),
+            "total_cost": round(purchase_cost, 2),
+            "transaction_costs": round(transaction_costs_total, 2),
+            "current_value": round(current_value, 2),
+            "current_money_weighted_return": round(current_return, 2),
+            "realized_return": round(realized_return, 2),
+            "net_return": round(net_return, 2),
+            "current_performance_percentage": round(current_performance_percentage, 2),
+            "net_performance_percentage": round(net_performance_percentage, 2)
+        }
@@ -0,0 +1,246 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import date, timedelta
+from urllib.parse import quote
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from backend.services.price_provider import PriceProvider
+from backend.utils.logger import app_logger
+
+PRICE_CACHE_DIR = os.getenv("PRICE_CACHE_DIR", "output/price_cache")
+
+# Hours after the end of a UTC day before its closing prices count as settled
+PRICE_SETTLE_LAG_HOURS = float(os.getenv("PRICE_SETTLE_LAG_HOURS", "6"))
+
+PRICE_SCHEMA = pa.schema([("date", pa.date32()), ("price", pa.float64())])
+TICKER_PARTITIONING = ds.partitioning(pa.schema([("ticker", pa.string())]), flavor="hive")
+
+def get_settled_through(now):
+    """Last day whose end-of-day closes are settled: the next UTC day has started plus the settle lag."""
+    return (now - timedelta(hours=PRICE_SETTLE_LAG_HOURS)).date() - timedelta(days=1)
+
+def merge_ranges(ranges):
+    """Merge overlapping / adjacent [start, end) date ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+class PriceCache:
+    """
+    Local Parquet cache of daily closes, one hive partition (ticker=...) per ticker,
+    with a coverage manifest of the [start, end) date ranges that hold settled prices.
+    """
+
+    def __init__(self, directory=PRICE_CACHE_DIR):
+        self.directory = directory
+        # Leading underscore: ignored by the Parquet dataset discovery
+        self.manifest_file = os.path.join(directory, "_coverage.json")
+        self._lock = threading.Lock()
+        self._coverage = self._load_coverage()
+
+    def _load_coverage(self):
+        if not os.path.exists(self.manifest_file):
+            return {}
+        with open(self.manifest_file, 'r') as f:
+            manifest = json.load(f)
+        return {
+            ticker: [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in ranges]
+            for ticker, ranges in manifest.items()
+        }
+
+    def _save_coverage(self):
+        manifest = {
+            ticker: [[start.isoformat(), end.isoformat()] for start, end in ranges]
+            for ticker, ranges in self._coverage.items()
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.coverage.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, self.manifest_file)
+
+    def _partition_path(self, ticker):
+        return os.path.join(self.directory, f"ticker={quote(ticker, safe='')}", "prices.parquet")
+
+    def get_missing_spans(self, ticker, start, end):
+        """[start, end) ranges without settled cached prices."""
+        missing = []
+        cursor = start
+        for covered_start, covered_end in self._coverage.get(ticker, []):
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start))
+            cursor = max(cursor, covered_end)
+        if cursor < end:
+            missing.append((cursor, end))
+        return missing
+
+    def is_covered(self, ticker, day):
+        """Whether the cache holds settled prices of ticker for day."""
+        return not self.get_missing_spans(ticker, day, day + timedelta(days=1))
+
+    def has_coverage(self, ticker):
+        """Whether the cache holds any settled prices of ticker, i.e. it isn't cold for the ticker."""
+        return bool(self._coverage.get(ticker))
+
+    def clear_coverage(self, tickers):
+        """Forget the covered ranges of the tickers, so their prices are fetched again (the cached rows stay until overwritten)."""
+        with self._lock:
+            if not any(ticker in self._coverage for ticker in tickers):
+                return
+            for ticker in tickers:
+                self._coverage.pop(ticker, None)
+            os.makedirs(self.directory, exist_ok=True)
+            self._save_coverage()
+
+    def add_coverage(self, tickers, start, end):
+        """Mark [start, end) as covered for the tickers and save the manifest."""
+        self.add_ticker_coverage({ticker: (start, end) for ticker in tickers})
+
+    def add_ticker_coverage(self, ranges):
+        """Mark a [start, end) range per ticker ({ticker: (start, end)}) as covered and save the manifest."""
+        ranges = {ticker: (start, end) for ticker, (start, end) in ranges.items() if start < end}
+        if not ranges:
+            return
+        with self._lock:
+            for ticker, (start, end) in ranges.items():
+                self._coverage[ticker] = merge_ranges(self._coverage.get(ticker, []) + [(start, end)])
+            os.makedirs(self.directory, exist_ok=True)
+            self._save_coverage()
+
+    def seed(self, prices, covered_from, covered_through):
+        """
+        Fill a cold cache from already stored prices: a long (ticker, date, price) DataFrame, e.g. the
+        stock_prices table. Each ticker is covered from covered_from (or its first price, if earlier)
+        up to covered_through[ticker].
+        """
+        prices = prices.dropna(subset=["price"])
+        ranges = {}
+        for ticker, ticker_prices in prices.groupby("ticker", sort=False):
+            days = pd.to_datetime(ticker_prices["date"]).dt.date
+            self.write({ticker: dict(zip(days, ticker_prices["price"]))})
+            ranges[ticker] = (min(covered_from, days.min()), covered_through[ticker] + timedelta(days=1))
+        self.add_ticker_coverage(ranges)
+
+    def write(self, prices):
+        """Merge {ticker: {date: price}} into the ticker partitions (NaN prices are dropped)."""
+        for ticker, ticker_prices in prices.items():
+            new = pd.DataFrame({"date": list(ticker_prices.keys()), "price": list(ticker_prices.values())}, columns=["date", "price"])
+            new = new.dropna(subset=["price"])
+            if new.empty:
+                continue
+
+            path = self._partition_path(ticker)
+            if os.path.exists(path):
+                existing = pq.read_table(path).to_pandas()
+                new = pd.concat([existing, new], ignore_index=True)
+            new = new.drop_duplicates(subset=["date"], keep="last").sort_values("date")
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temp file, so concurrent runs never replace the partition with a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.prices.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pq.write_table(pa.Table.from_pandas(new, schema=PRICE_SCHEMA, preserve_index=False), f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def read(self, tickers, start, end):
+        """
+        DataFrame (ticker, date, price) of the cached prices in [start, end).
+        Only the ticker partitions and row groups matching the filter are read.
+        """
+        columns = ["ticker", "date", "price"]
+        if not tickers or not os.path.isdir(self.directory):
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(
+            self.directory,
+            schema=PRICE_SCHEMA.append(pa.field("ticker", pa.string())),
+            format="parquet",
+            partitioning=TICKER_PARTITIONING,
+        )
+        table = dataset.to_table(
+            columns=columns,
+            filter=(
+                ds.field("ticker").isin(list(tickers))
+                & (ds.field("date") >= pa.scalar(start, pa.date32()))
+                & (ds.field("date") < pa.scalar(end, pa.date32()))
+            ),
+        )
+        return table.to_pandas()
+
+class CachedPriceProvider(PriceProvider):
+    """
+    Serves prices from a PriceCache and only fetches the spans the cache doesn't cover from
+    the source provider. A ticker's span is marked as covered up to its last returned price, or
+    up to settled_through when the source answered without prices, so provisional days are
+    refetched on the next request.
+    Tickers whose fetch failed stay uncovered, so they are fetched again on the next run;
+    they are collected in failed_tickers and served from whatever the cache already holds.
+    """
+
+    def __init__(self, source, cache, settled_through):
+        self.source = source
+        self.cache = cache
+        self.settled_through = settled_through
+        self.failed_tickers = set()
+
+    def get_price_frame(self, tickers, start, end):
+        """
+        Long DataFrame (ticker, date, price) of the prices in [start, end), read from the cache
+        after fetching the spans it doesn't cover.
+        """
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        tickers = list(dict.fromkeys(tickers))
+
+        # Tickers with the same missing span are fetched together
+        fetch_groups = {}
+        for ticker in tickers:
+            for span in self.cache.get_missing_spans(ticker, start, end):
+                fetch_groups.setdefault(span, []).append(ticker)
+
+        failed_tickers = set()
+        for (span_start, span_end), span_tickers in sorted(fetch_groups.items()):
+            app_logger.info(f"[PRICE-CACHE] Fetching {len(span_tickers)} ticker(s) from {span_start.isoformat()} to {span_end.isoformat()}")
+            fetched, span_failed = self.source.get_prices_with_failures(span_tickers, span_start, span_end)
+            succeeded = [ticker for ticker in span_tickers if ticker not in span_failed]
+            self.cache.write({ticker: fetched.get(ticker, {}) for ticker in succeeded})
+
+            # Covered through the last price a ticker returned, so a lagging source is asked again.
+            # A successful empty answer (e.g. delisted) covers the whole settled span.
+            covered_end = min(span_end, self.settled_through + timedelta(days=1))
+            coverage = {}
+            for ticker in succeeded:
+                days = [day for day, price in fetched.get(ticker, {}).items() if price == price]
+                coverage[ticker] = (span_start, min(covered_end, max(days) + timedelta(days=1)) if days else covered_end)
+            self.cache.add_ticker_coverage(coverage)
+            failed_tickers.update(span_failed)
+
+        if failed_tickers:
+            app_logger.warning(f"[PRICE-CACHE] Fetch failed for {sorted(failed_tickers)}, using cached prices and retrying on the next run")
+        self.failed_tickers.update(failed_tickers)
+
+        return self.cache.read(tickers, start, end)
+
+    def get_prices_with_failures(self, tickers, start, end):
+        tickers = list(dict.fromkeys(tickers))
+        cached = self.get_price_frame(tickers, start, end)
+
+        prices = {ticker: {} for ticker in tickers}
+        for ticker, ticker_prices in cached.groupby("ticker", sort=False):
+            prices[ticker] = dict(zip(ticker_prices["date"], ticker_prices["price"]))
+        return prices, [ticker for ticker in tickers if ticker in self.failed_tickers]
@@ -0,0 +1,274 @@
+import os
+import random
+from abc import ABC, abstractmethod
+import threading
+import time
+from datetime import timedelta
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFPricesMissingError, YFTzMissingError
+from backend.utils.logger import app_logger
+
+# Price source: "yfinance", "file" (offline, reads PRICE_FILE_DIR) or "record" (yfinance, also writes PRICE_FILE_DIR)
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "yfinance").lower()
+PRICE_FILE_DIR = os.getenv("PRICE_FILE_DIR", "output/price_files")
+
+# yfinance fetch chunking: tickers per chunk, days per chunk and download threads per chunk
+PRICE_FETCH_CHUNK_TICKERS = int(os.getenv("PRICE_FETCH_CHUNK_TICKERS", "20"))
+PRICE_FETCH_CHUNK_DAYS = int(os.getenv("PRICE_FETCH_CHUNK_DAYS", "730"))
+PRICE_FETCH_WORKERS = int(os.getenv("PRICE_FETCH_WORKERS", "4"))
+
+# Request pacing against Yahoo: token bucket of requests per second with a burst capacity
+PRICE_FETCH_RATE = float(os.getenv("PRICE_FETCH_RATE", "2"))
+PRICE_FETCH_BURST = int(os.getenv("PRICE_FETCH_BURST", "5"))
+
+# Retries per chunk with jittered exponential backoff (seconds)
+PRICE_FETCH_RETRIES = int(os.getenv("PRICE_FETCH_RETRIES", "4"))
+PRICE_FETCH_BACKOFF = float(os.getenv("PRICE_FETCH_BACKOFF", "2"))
+PRICE_FETCH_BACKOFF_MAX = float(os.getenv("PRICE_FETCH_BACKOFF_MAX", "60"))
+
+def fx_ticker(first_currency, second_currency):
+    """Yahoo Finance ticker of an FX pair, e.g. USDEUR=X."""
+    return f"{first_currency}{second_currency}=X"
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be made."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def backoff_delay(attempt, base=PRICE_FETCH_BACKOFF, maximum=PRICE_FETCH_BACKOFF_MAX):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+class PriceProvider(ABC):
+    """
+    Source of daily closing prices.
+    Dates are 'YYYY-MM-DD' strings or dates; end is exclusive like yf.download.
+    """
+
+    def get_prices(self, tickers, start, end):
+        """Daily closes as {ticker: {date: price}}, with an entry for every requested ticker."""
+        prices, _ = self.get_prices_with_failures(tickers, start, end)
+        return prices
+
+    @abstractmethod
+    def get_prices_with_failures(self, tickers, start, end):
+        """
+        Like get_prices, but also returns the tickers whose fetch failed: (prices, failed_tickers).
+        Failed tickers have no prices; a ticker without data in the range is not a failure.
+        """
+
+    def get_fx_rates(self, currencies, second_currency, start, end):
+        """Daily FX rates of each currency to second_currency as {currency: {date: rate}}."""
+        pair_tickers = {currency: fx_ticker(currency, second_currency) for currency in currencies}
+        rates = self.get_prices(list(pair_tickers.values()), start, end)
+        return {currency: rates.get(pair_ticker, {}) for currency, pair_ticker in pair_tickers.items()}
+
+class YFinanceProvider(PriceProvider):
+    """
+    Fetches closes from Yahoo Finance in chunks of tickers and date spans, one threaded
+    yf.download call per chunk. yf.download keeps per-call state in module globals, so the chunks run
+    one after another and the concurrency comes from its own download threads.
+    Requests are paced by a shared token bucket; failed tickers of a chunk are retried
+    with jittered exponential backoff and reported as failed once the retries run out.
+    """
+
+    def __init__(self, chunk_tickers=PRICE_FETCH_CHUNK_TICKERS, chunk_days=PRICE_FETCH_CHUNK_DAYS, workers=PRICE_FETCH_WORKERS,
+                 rate=PRICE_FETCH_RATE, burst=PRICE_FETCH_BURST, retries=PRICE_FETCH_RETRIES):
+        self.chunk_tickers = max(1, chunk_tickers)
+        self.chunk_days = max(1, chunk_days)
+        self.workers = max(1, workers)
+        self.retries = max(0, retries)
+        self.token_bucket = TokenBucket(rate, burst)
+
+    def get_chunks(self, tickers, start, end):
+        """Split the request into (tickers, span_start, span_end) chunks."""
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        spans = []
+        span_start = start
+        while span_start < end:
+            span_end = min(span_start + timedelta(days=self.chunk_days), end)
+            spans.append((span_start, span_end))
+            span_start = span_end
+
+        ticker_chunks = [tickers[i:i + self.chunk_tickers] for i in range(0, len(tickers), self.chunk_tickers)]
+        return [(chunk, span_start, span_end) for chunk in ticker_chunks for span_start, span_end in spans]
+
+    def fetch_ticker(self, ticker, start, end):
+        """Closes of one ticker as {date: price}. Raises on failed requests (e.g. rate limiting)."""
+        self.token_bucket.acquire()
+        try:
+            history = yf.Ticker(ticker).history(start=start, end=end, interval="1d", raise_errors=True)
+        except (YFPricesMissingError, YFTzMissingError):
+            # No prices in the range or delisted: a valid, empty answer
+            return {}
+        if history.empty or "Close" not in history:
+            return {}
+        return {timestamp.date(): price for timestamp, price in history["Close"].items()}
+
+    def download_chunk(self, tickers, start, end):
+        """
+        Closes of several tickers from one threaded yf.download call as {ticker: {date: price}}.
+        Tickers without closes in the result are left out: yf.download doesn't raise per ticker.
+        """
+        data = yf.download(
+            list(tickers), start=start, end=end, interval="1d", group_by="ticker",
+            auto_adjust=True, threads=self.workers, progress=False, multi_level_index=True
+        )
+        if data is None or data.empty:
+            return {}
+
+        prices = {}
+        downloaded = set(data.columns.get_level_values(0))
+        for ticker in tickers:
+            # yf.download upper-cases the symbols
+            symbol = ticker if ticker in downloaded else ticker.upper()
+            if symbol not in downloaded or "Close" not in data[symbol]:
+                continue
+            closes = data[symbol]["Close"].dropna()
+            if not closes.empty:
+                prices[ticker] = {timestamp.date(): price for timestamp, price in closes.items()}
+        return prices
+
+    def fetch_chunk(self, tickers, start, end):
+        """
+        Fetch one chunk with a single threaded yf.download call. Tickers it returned no closes for
+        are fetched on their own, which tells an empty range apart from a failed request, and retried.
+        Returns (prices, failed_tickers, wall time), timed from the start of the download, not the pacing wait.
+        """
+        for _ in tickers:
+            self.token_bucket.acquire()
+        chunk_start = time.time()
+        prices = {}
+        try:
+            prices = self.download_chunk(tickers, start, end)
+        except Exception as e:
+            app_logger.warning(f"[PRICE-FETCH] Downloading {len(tickers)} ticker(s) failed: {e}")
+
+        pending = [ticker for ticker in tickers if ticker not in prices]
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = backoff_delay(attempt - 1)
+                app_logger.warning(f"[PRICE-FETCH] Retrying {len(pending)} ticker(s) in {round(delay, 1)}s (attempt {attempt + 1}/{self.retries + 1})")
+                time.sleep(delay)
+
+            failed = []
+            for ticker in pending:
+                try:
+                    prices[ticker] = self.fetch_ticker(ticker, start, end)
+                except Exception as e:
+                    app_logger.warning(f"[PRICE-FETCH] Fetching {ticker} failed: {e}")
+                    failed.append(ticker)
+            pending = failed
+            if not pending:
+                break
+
+        return prices, pending, time.time() - chunk_start
+
+    def get_prices_with_failures(self, tickers, start, end):
+        tickers = list(dict.fromkeys(tickers))
+        chunks = self.get_chunks(tickers, start, end)
+        prices = {ticker: {} for ticker in tickers}
+        failed_tickers = set()
+        if not chunks:
+            return prices, []
+
+        fetch_start = time.time()
+        for i, (chunk, span_start, span_end) in enumerate(chunks, start=1):
+            chunk_prices, chunk_failed, chunk_time = self.fetch_chunk(chunk, span_start, span_end)
+            app_logger.info(
+                f"[PRICE-FETCH] Chunk {i}/{len(chunks)}: {len(chunk)} ticker(s) "
+                f"{span_start.isoformat()} to {span_end.isoformat()} in {round(chunk_time, 2)}s"
+                + (f", {len(chunk_failed)} failed" if chunk_failed else "")
+            )
+            for ticker, ticker_prices in chunk_prices.items():
+                prices[ticker].update(ticker_prices)
+            failed_tickers.update(chunk_failed)
+
+        # A ticker that failed in any date span has an incomplete result
+        for ticker in failed_tickers:
+            prices[ticker] = {}
+
+        app_logger.info(f"[PRICE-FETCH] Fetched {len(tickers) - len(failed_tickers)}/{len(tickers)} ticker(s) in {len(chunks)} chunks ({round(time.time() - fetch_start, 2)}s)")
+        return prices, [ticker for ticker in tickers if ticker in failed_tickers]
+
+class FilePriceProvider(PriceProvider):
+    """
+    Offline stand-in that reads closes from one CSV file (date,price) per ticker in a directory,
+    so the calculation can run and be benchmarked without network access.
+    """
+
+    def __init__(self, directory=PRICE_FILE_DIR):
+        self.directory = directory
+
+    def get_path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.csv")
+
+    def read_prices(self, ticker):
+        path = self.get_path(ticker)
+        if not os.path.exists(path):
+            app_logger.warning(f"[PRICE-FETCH] No price file for {ticker} in {self.directory}")
+            return pd.Series(dtype=float)
+
+        prices = pd.read_csv(path, parse_dates=["date"])
+        return prices.set_index(prices["date"].dt.date)["price"]
+
+    def get_prices_with_failures(self, tickers, start, end):
+        start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+        prices = {}
+        for ticker in dict.fromkeys(tickers):
+            ticker_prices = self.read_prices(ticker)
+            prices[ticker] = {
+                day: price for day, price in ticker_prices.items()
+                if start <= day < end
+            }
+        return prices, []
+
+    def save_prices(self, prices):
+        """Merge {ticker: {date: price}} into the price files."""
+        os.makedirs(self.directory, exist_ok=True)
+        for ticker, ticker_prices in prices.items():
+            existing = self.read_prices(ticker).to_dict() if os.path.exists(self.get_path(ticker)) else {}
+            merged = {**existing, **ticker_prices}
+            pd.DataFrame(
+                {"date": list(merged.keys()), "price": list(merged.values())}
+            ).sort_values("date").to_csv(self.get_path(ticker), index=False)
+
+class RecordingPriceProvider(PriceProvider):
+    """Fetches from a source provider and records the results as price files for offline runs."""
+
+    def __init__(self, source, store):
+        self.source = source
+        self.store = store
+
+    def get_prices_with_failures(self, tickers, start, end):
+        prices, failed_tickers = self.source.get_prices_with_failures(tickers, start, end)
+        self.store.save_prices({ticker: prices[ticker] for ticker in prices if ticker not in failed_tickers})
+        return prices, failed_tickers
+
+def get_price_provider():
+    """Price provider selected with the PRICE_PROVIDER environment variable."""
+    if PRICE_PROVIDER == "file":
+        return FilePriceProvider()
+    if PRICE_PROVIDER == "record":
+        return RecordingPriceProvider(YFinanceProvider(), FilePriceProvider())
+    return YFinanceProvider()
@@ -0,0 +1,123 @@
+from datetime import date
+import numpy as np
+
+# date.toordinal() of the NumPy datetime64 epoch (1970-01-01)
+EPOCH_ORDINAL = 719163
+
+def to_ordinals(days):
+    """Convert a sequence of dates / datetime64 values to an int64 array of date ordinals."""
+    return np.asarray(days, dtype="datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+
+class PriceSeries:
+    """
+    Compact daily price series of a single ticker.
+
+    Dates are stored as sorted int64 date ordinals next to a float64 price buffer, with
+    NaN/None prices dropped once at construction. "Last available price on or before D"
+    is a binary search (O(log n)), for a single date or a whole array of dates at once.
+    """
+
+    __slots__ = ("ordinals", "prices")
+
+    def __init__(self, ordinals, prices):
+        self.ordinals = ordinals
+        self.prices = prices
+
+    @classmethod
+    def from_dict(cls, date_prices):
+        """Build from a {date: price} dict; NaN/None prices are dropped, later keys win on duplicates."""
+        items = [(d.toordinal(), p) for d, p in date_prices.items() if p is not None and p == p]
+        if not items:
+            return cls.empty()
+
+        ordinals = np.fromiter((o for o, _ in items), dtype=np.int64, count=len(items))
+        prices = np.fromiter((p for _, p in items), dtype=np.float64, count=len(items))
+        return cls._sorted_unique(ordinals, prices)
+
+    @classmethod
+    def from_arrays(cls, dates, prices):
+        """Build from aligned arrays of dates (date / datetime64) and prices."""
+        ordinals = to_ordinals(dates)
+        prices = np.asarray(prices, dtype=np.float64)
+        keep = ~np.isnan(prices)
+        return cls._sorted_unique(ordinals[keep], prices[keep])
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+    @classmethod
+    def _sorted_unique(cls, ordinals, prices):
+        order = np.argsort(ordinals, kind="stable")
+        ordinals, prices = ordinals[order], prices[order]
+
+        # Keep the last price of duplicate dates
+        if len(ordinals) > 1:
+            last = np.append(ordinals[1:] != ordinals[:-1], True)
+            ordinals, prices = ordinals[last], prices[last]
+        return cls(ordinals, prices)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def merge(self, other):
+        """Return a new series with the prices of both; prices of other win on the same date."""
+        return self._sorted_unique(
+            np.concatenate([self.ordinals, other.ordinals]),
+            np.concatenate([self.prices, other.prices]),
+        )
+
+    def _index_on_or_before(self, ordinal, not_before=None):
+        idx = np.searchsorted(self.ordinals, ordinal, side="right") - 1
+        if idx < 0:
+            return None
+        if not_before is not None and self.ordinals[idx] < not_before.toordinal():
+            return None
+        return idx
+
+    def date_on_or_before(self, day, not_before=None):
+        """Last date with a price on or before day (and not before not_before), or None."""
+        idx = self._index_on_or_before(day.toordinal(), not_before)
+        return None if idx is None else date.fromordinal(int(self.ordinals[idx]))
+
+    def date_on_or_after(self, day, not_after=None):
+        """First date with a price on or after day (and not after not_after), or None."""
+        idx = np.searchsorted(self.ordinals, day.toordinal(), side="left")
+        if idx >= len(self.ordinals):
+            return None
+        if not_after is not None and self.ordinals[idx] > not_after.toordinal():
+            return None
+        return date.fromordinal(int(self.ordinals[idx]))
+
+    def price_on_or_before(self, day, not_before=None):
+        """Last available price on or before day (and not before not_before), or None."""
+        idx = self._index_on_or_before(day.toordinal(), not_before)
+        return None if idx is None else float(self.prices[idx])
+
+    def prices_on_or_before(self, days, not_before=None):
+        """
+        Vectorized price_on_or_before for an array of dates.
+        Returns a float64 array with NaN where no price is available.
+        """
+        day_ordinals = to_ordinals(days)
+        result = np.full(len(day_ordinals), np.nan)
+        if not len(self.ordinals):
+            return result
+
+        idx = np.searchsorted(self.ordinals, day_ordinals, side="right") - 1
+        valid = idx >= 0
+        if not_before is not None:
+            valid &= self.ordinals[np.maximum(idx, 0)] >= not_before.toordinal()
+
+        result[valid] = self.prices[idx[valid]]
+        return result
+
+    def to_dict(self):
+        """{date: price} dict of the series."""
+        return {date.fromordinal(int(o)): float(p) for o, p in zip(self.ordinals, self.prices)}
+
+def as_price_series(stock_price_data):
+    """Accept a PriceSeries or a {date: price} dict (or None) and return a PriceSeries."""
+    if isinstance(stock_price_data, PriceSeries):
+        return stock_price_data
+    return PriceSeries.from_dict(stock_price_data or {})
@@ -0,0 +1,73 @@
+from types import MappingProxyType
+import numpy as np
+
+class TickerTransactions:
+    """
+    Date-sorted, read-only NumPy arrays with the transactions of a single ticker.
+    Slicing up to an end date is a binary search and returns views, not copies.
+    """
+
+    __slots__ = ("dates", "quantities", "costs", "fees", "actions")
+
+    def __init__(self, dates, quantities, costs, fees, actions):
+        self.dates = dates
+        self.quantities = quantities
+        self.costs = costs
+        self.fees = fees
+        self.actions = actions
+
+        for array in (dates, quantities, costs, fees, actions):
+            array.setflags(write=False)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def upto(self, end_date):
+        """Return the transactions on or before end_date (zero-copy slice)."""
+        end = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right")
+        return TickerTransactions(
+            self.dates[:end],
+            self.quantities[:end],
+            self.costs[:end],
+            self.fees[:end],
+            self.actions[:end],
+        )
+
+    def after(self, day):
+        """Return the transactions after day (zero-copy slice)."""
+        start = np.searchsorted(self.dates, np.datetime64(day, "D"), side="right")
+        return TickerTransactions(
+            self.dates[start:],
+            self.quantities[start:],
+            self.costs[start:],
+            self.fees[start:],
+            self.actions[start:],
+        )
+
+    def rows(self):
+        """Iterate (action, quantity, cost, transaction_costs) in date/time order."""
+        return zip(self.actions, self.quantities, self.costs, self.fees)
+
+def build_transaction_index(transactions):
+    """
+    Group the transactions DataFrame per ticker into TickerTransactions.
+    Rows are sorted on Date and Time, rows without a ticker are left out.
+    Returns a read-only {ticker: TickerTransactions} mapping.
+    """
+    if transactions.empty:
+        return MappingProxyType({})
+
+    transactions = transactions[transactions["Stock"].notna() & (transactions["Stock"] != '')]
+    transactions = transactions.sort_values(by=["Date", "Time"], kind="stable")
+
+    index = {}
+    for stock, stock_transactions in transactions.groupby("Stock", sort=False):
+        index[stock] = TickerTransactions(
+            dates=np.array(stock_transactions["Date"].tolist(), dtype="datetime64[D]"),
+            quantities=stock_transactions["Quantity"].to_numpy(copy=True),
+            costs=stock_transactions["Cost"].to_numpy(dtype=float, copy=True),
+            fees=stock_transactions["Transaction_costs"].to_numpy(dtype=float, copy=True),
+            actions=stock_transactions["Action"].to_numpy(dtype=str, copy=True),
+        )
+
+    return MappingProxyType(index)
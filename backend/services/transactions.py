@@ -1,16 +1,21 @@
 import pandas as pd
 import os
 import json
+import tempfile
 import warnings
 import traceback
 import re
 from backend.utils.logger import app_logger
+from backend.utils.isin_mapping import get_isin_mapping, save_isin_mapping
 
 warnings.simplefilter(action='ignore', category=pd.errors.SettingWithCopyWarning)
 
 # File Paths
 TRANSACTION_FILE = 'uploads/Transactions.csv'
-MAPPING_FILE = 'output/isin_mapping.json'
+FINGERPRINT_FILE = 'output/transaction_fingerprints.json'
+
+# Columns that define a transaction for change detection
+FINGERPRINT_COLUMNS = ['Time', 'ISIN', 'Quantity', 'Price', 'Currency', 'Cost', 'Transaction_costs', 'Action']
 
 def detect_decimal_separator(file_path: str) -> str:
     """
@@ -43,11 +48,8 @@ def update_isin_mapping_json(df: pd.DataFrame):
         app_logger.warning("[ISIN-MAPPING] Columns required for ISIN mapping are missing. Skipping update.")
         return
 
-    # Load existing mapping or initialize an empty one
-    existing_mapping = {}
-    if os.path.exists(MAPPING_FILE):
-        with open(MAPPING_FILE, 'r') as f:
-            existing_mapping = json.load(f)
+    # Load existing mapping (empty if there is no mapping file yet)
+    existing_mapping = get_isin_mapping()
 
     def is_valid_isin(isin: str) -> bool:
         return isinstance(isin, str) and re.fullmatch(r"[A-Z]{2}[A-Z0-9]{10}", isin) is not None
@@ -77,8 +79,7 @@ def update_isin_mapping_json(df: pd.DataFrame):
          }
 
     # Save the updated mapping back to the JSON file
-    with open(MAPPING_FILE, 'w') as f:
-        json.dump(existing_mapping, f, indent=4)
+    save_isin_mapping(existing_mapping)
     
     return existing_mapping
 
@@ -155,10 +156,78 @@ def load_and_prepare_data() -> pd.DataFrame:
         app_logger.error(f"[TRANSACTIONS] Error loading or processing transaction data: {e}", exc_info=True)
         return pd.DataFrame()
 
-def get_transactions() -> pd.DataFrame:
+def fingerprint_transactions(df: pd.DataFrame) -> dict:
+    """
+    Builds a {ticker: {date (ISO): hash}} fingerprint of the transactions.
+    The hash of a (ticker, date) combines the hashes of all its rows, independent of row order.
+    """
+    if df.empty or 'Stock' not in df.columns:
+        return {}
+
+    df = df[df['Stock'].notna() & (df['Stock'] != '')]
+    row_hashes = pd.util.hash_pandas_object(df[FINGERPRINT_COLUMNS].astype(str), index=False)
+
+    day_hashes = row_hashes.groupby([df['Stock'], df['Date']]).sum()
+
+    fingerprints = {}
+    for (stock, day), day_hash in day_hashes.items():
+        fingerprints.setdefault(stock, {})[day.isoformat()] = str(day_hash)
+    return fingerprints
+
+def diff_transaction_fingerprints(current: dict, previous: dict) -> dict:
+    """
+    Compares two fingerprints and returns {ticker: earliest changed date} for every ticker
+    with added, removed or modified transactions.
+    """
+    changed = {}
+    for stock in set(current) | set(previous):
+        current_days = current.get(stock, {})
+        previous_days = previous.get(stock, {})
+        changed_days = [
+            day for day in set(current_days) | set(previous_days)
+            if current_days.get(day) != previous_days.get(day)
+        ]
+        if changed_days:
+            changed[stock] = pd.to_datetime(min(changed_days)).date()
+    return changed
+
+def load_transaction_fingerprints():
+    """Returns the fingerprints of the last calculated transactions, or None if there are none."""
+    if not os.path.exists(FINGERPRINT_FILE):
+        return None
+    try:
+        with open(FINGERPRINT_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        app_logger.warning(f"[TRANSACTIONS] Could not read transaction fingerprints: {e}")
+        return None
+
+def save_transaction_fingerprints(fingerprints: dict):
+    """Stores the fingerprints of the transactions the portfolio data was calculated from."""
+    directory = os.path.dirname(FINGERPRINT_FILE) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    # Unique temp file + rename, so concurrent runs never write into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.transaction_fingerprints.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(fingerprints, f)
+        # mkstemp creates the file as 0600
+        os.chmod(tmp_path, os.stat(FINGERPRINT_FILE).st_mode & 0o777 if os.path.exists(FINGERPRINT_FILE) else 0o644)
+        os.replace(tmp_path, FINGERPRINT_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_transactions(with_changes: bool = False):
     """
     Returns a copy of the cleaned transactions DataFrame.
     Ensures consumers can't modify the original data.
+
+    With with_changes=True, the transactions are fingerprinted per ticker and compared with
+    the fingerprints of the last calculation. Returns (transactions_df, changed_tickers, fingerprints),
+    where changed_tickers is {ticker: earliest changed date}.
     """
     try:
         app_logger.info("[TRANSACTIONS] Processing transactions...")
@@ -166,8 +235,22 @@ def get_transactions() -> pd.DataFrame:
         transactions_df = load_and_prepare_data()
         app_logger.info("[TRANSACTIONS] Transactions processed successfully.")
 
+        if with_changes:
+            fingerprints = fingerprint_transactions(transactions_df)
+            previous_fingerprints = load_transaction_fingerprints()
+            if previous_fingerprints is None:
+                # No previous load known: treat every ticker as changed from its first transaction
+                changed_tickers = diff_transaction_fingerprints(fingerprints, {})
+            else:
+                changed_tickers = diff_transaction_fingerprints(fingerprints, previous_fingerprints)
+
+            if changed_tickers:
+                app_logger.info(f"[TRANSACTIONS] Changed transactions for {len(changed_tickers)} ticker(s) since the last calculation.")
+
     except Exception as e:
         app_logger.error(f"[TRANSACTIONS] Error during transactions processing: {e}", exc_info=True)
         raise e
-    
+
+    if with_changes:
+        return transactions_df.copy(), changed_tickers, fingerprints
     return transactions_df.copy()
\ No newline at end of file
@@ -24,6 +24,9 @@ UPLOAD_SUCCESS_MSG = "File uploaded successfully! Please reload the page."
 # Date range options
 DATE_RANGE_OPTIONS = ["1Y", "3M", "1M", "1W", "YTD", "Last year", "Last month", "All time"]
 
+# Points per line above which charts downsample the series before plotting
+CHART_MAX_POINTS = 500
+
 # Performance metric rename dictionary (for display purposes)
 PERFORMANCE_METRIC_RENAME = {
     'product': 'Product',
@@ -1,10 +1,59 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
 import requests
 import os
+import threading
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Last responses with an ETag per request (URL + Accept header), shared by all sessions
+REVALIDATION_CACHE_SIZE = 32
+_revalidation_lock = threading.Lock()
+_revalidation_cache = OrderedDict()
+
+def get_revalidated(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None, timeout: int = 20) -> requests.Response:
+    """
+    GET request that revalidates the last response of the same request with If-None-Match.
+    When the data version hasn't changed the API answers 304 Not Modified and the stored response is returned,
+    so unchanged data isn't downloaded again.
+    """
+    headers = dict(headers or {})
+    key = (requests.Request("GET", url, params=params).prepare().url, headers.get("Accept"))
+    with _revalidation_lock:
+        cached = _revalidation_cache.get(key)
+    if cached is not None:
+        headers["If-None-Match"] = cached.headers["ETag"]
+
+    response = requests.get(url, params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached is not None:
+        with _revalidation_lock:
+            _revalidation_cache.move_to_end(key)
+        return cached
+
+    response.raise_for_status()
+    with _revalidation_lock:
+        if "ETag" in response.headers:
+            _revalidation_cache[key] = response
+            _revalidation_cache.move_to_end(key)
+            while len(_revalidation_cache) > REVALIDATION_CACHE_SIZE:
+                _revalidation_cache.popitem(last=False)
+        else:
+            _revalidation_cache.pop(key, None)
+    return response
+
+def read_arrow_stream(content: bytes) -> pd.DataFrame:
+    """
+    DataFrame of an Arrow IPC stream. Columns are converted without intermediate copies where possible;
+    dates become datetime64. Returns an empty DataFrame if the stream has no rows.
+    """
+    table = pa.ipc.open_stream(pa.py_buffer(content)).read_all()
+    if table.num_rows == 0:
+        return pd.DataFrame()
+    return table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
 
 @st.cache_data(ttl=60, show_spinner="Loading data...")
 def get_portfolio_performance_daily(
@@ -25,10 +74,14 @@ def get_portfolio_performance_daily(
         params["end_date"] = end_date
 
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/data/portfolio-daily", params=params, timeout=20
+        # Columnar Arrow stream: dates arrive typed, no JSON parsing per row
+        response = get_revalidated(
+            f"{API_BASE_URL}/data/portfolio-daily", params=params, timeout=20,
+            headers={"Accept": f"{ARROW_STREAM_MEDIA_TYPE}, application/json;q=0.5"}
         )
-        response.raise_for_status()
+        if response.headers.get("Content-Type", "").startswith(ARROW_STREAM_MEDIA_TYPE):
+            return read_arrow_stream(response.content)
+
         data = response.json()
         if not data:
             return pd.DataFrame()
@@ -44,6 +97,61 @@ def get_portfolio_performance_daily(
         st.error(f"Failed to load portfolio data from API: {e}")
         return pd.DataFrame()
 
+@st.cache_data(ttl=60, show_spinner="Loading data...")
+def get_type_split(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    metrics: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Fetches the daily metrics per product type, aggregated by the backend API.
+    Returns an empty DataFrame if the API call fails or returns no data.
+    """
+    params = {}
+    if start_date:
+        params["start_date"] = start_date
+    if end_date:
+        params["end_date"] = end_date
+    if metrics:
+        params["metrics"] = metrics
+
+    try:
+        response = get_revalidated(f"{API_BASE_URL}/data/type-split", params=params, timeout=20)
+        data = response.json()
+        if not data:
+            return pd.DataFrame()
+
+        df = pd.DataFrame(data)
+        df["end_date"] = pd.to_datetime(df["end_date"])
+        return df
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load type split from API: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(ttl=60, show_spinner="Loading data...")
+def get_portfolio_snapshot(as_of: Optional[str] = None, trend_days: int = 30) -> Dict[str, Any]:
+    """
+    Fetches the portfolio snapshot on the last day with data on or before as_of (latest by default):
+    the products' rows with their net performance trend, and the totals of that day and the day before.
+    Returns a snapshot without products if the API call fails.
+    """
+    params = {"trend_days": trend_days}
+    if as_of:
+        params["as_of"] = as_of
+
+    try:
+        response = get_revalidated(f"{API_BASE_URL}/data/snapshot", params=params, timeout=20)
+        snapshot = response.json()
+
+        for key in ["date", "previous_date"]:
+            if snapshot.get(key):
+                snapshot[key] = pd.to_datetime(snapshot[key])
+
+        return snapshot
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load portfolio snapshot from API: {e}")
+        return {"date": None, "previous_date": None, "totals": None, "previous_totals": None, "products": []}
+
 @st.cache_data(ttl=300, show_spinner="Loading filter options...")
 def get_portfolio_metadata() -> Dict[str, Any]:
     """
@@ -51,8 +159,7 @@ def get_portfolio_metadata() -> Dict[str, Any]:
     This is used to populate filter widgets without loading the entire dataset.
     """
     try:
-        response = requests.get(f"{API_BASE_URL}/data/portfolio-metadata", timeout=10)
-        response.raise_for_status()
+        response = get_revalidated(f"{API_BASE_URL}/data/portfolio-metadata", timeout=10)
         metadata = response.json()
 
         # Ensure date strings are converted to datetime objects
@@ -1,14 +1,25 @@
+import io
 import os
+import uuid
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, select, cast, func, tuple_, literal_column, Table, Column, MetaData, Date, Float, Integer, Numeric
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import OperationalError
 from backend.db.base import Base 
 from backend.models.portfolio_daily import PortfolioPerformanceDailyTable
 from backend.models.stock_prices import StockPricesTable
+from backend.models.position_snapshots import PositionSnapshotsTable
+from backend.models.price_watermarks import PriceWatermarksTable
+from backend.models.fx_rates import FxRatesTable, FxRateCoverageTable
+from backend.models.dimensions import ProductsTable, CurrencyPairsTable
+from backend.models.schema_migrations import SchemaMigrationsTable
+from backend.models.portfolio_metadata import PortfolioMetadataTable
+from backend.services.position_ledger import LEDGER_STATE_FIELDS
 from backend.utils.logger import app_logger
 import time
+from datetime import datetime, timezone
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "portfolio_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "default_pass1234!")
@@ -23,6 +34,18 @@ POSTGRES_URL = os.getenv(
 
 engine = create_engine(POSTGRES_URL)
 
+# Rows per COPY chunk of the bulk upsert (bounds the CSV buffer held in memory)
+DB_COPY_CHUNK_ROWS = int(os.getenv("DB_COPY_CHUNK_ROWS", "50000"))
+
+# Rows per fetch of the server-side cursor of the table loaders
+DB_FETCH_CHUNK_ROWS = int(os.getenv("DB_FETCH_CHUNK_ROWS", "50000"))
+
+# Columns stored as a small integer key (<column>_id) into a dimension table
+DIMENSION_TABLES = {
+    "product": ProductsTable.__table__,
+    "currency_pair": CurrencyPairsTable.__table__,
+}
+
 def wait_for_db():
     """
     At startup, wait for the database to be ready before proceeding.
@@ -100,63 +123,369 @@ def check_postgres_connection():
         app_logger.error(f"[DB CHECK] Unexpected error during DB connection check: {e}")
         return False
 
-def load_portfolio_performance_from_db():
+def select_column(column):
+    """Select expression of a column; NUMERIC is cast to float so the driver doesn't build Decimals."""
+    if isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+        return cast(column, Float).label(column.name)
+    return column
+
+def column_array(column, values):
+    """Typed NumPy array of a chunk of column values (NULL becomes NaN / NaT)."""
+    if isinstance(column.type, Date):
+        return np.array(values, dtype="datetime64[D]")
+    if isinstance(column.type, (Numeric, Integer)):
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=object)
+
+def load_dimension(name):
+    """{key: value} of the dimension table of a column, e.g. {product_id: product}."""
+    table = DIMENSION_TABLES[name]
+    with engine.connect() as conn:
+        return dict(conn.execute(select(table.c[f"{name}_id"], table.c[name])).all())
+
+def get_dimension_keys(name, values):
+    """{value: key} of the values in the dimension table of a column, adding the values it doesn't have yet."""
+    table = DIMENSION_TABLES[name]
+    values = [value for value in pd.unique(values) if pd.notna(value)]
+    if not values:
+        return {}
+
+    with engine.begin() as conn:
+        conn.execute(insert(table).values([{name: value} for value in values]).on_conflict_do_nothing(index_elements=[name]))
+        rows = conn.execute(select(table.c[name], table.c[f"{name}_id"]).where(table.c[name].in_(values))).all()
+    return dict(rows)
+
+def encode_dimensions(df, table):
+    """Replace the dimension columns of df (e.g. product) by the keys table stores (e.g. product_id)."""
+    for name in DIMENSION_TABLES:
+        if name in df.columns and f"{name}_id" in table.c:
+            keys = get_dimension_keys(name, df[name])
+            df = df.assign(**{f"{name}_id": df[name].map(keys).astype("Int64")}).drop(columns=[name])
+    return df
+
+def frame_columns(table):
+    """Column names of a table as loaded into a DataFrame, with dimension keys as their values."""
+    return [c.name[:-len("_id")] if c.name[:-len("_id")] in DIMENSION_TABLES else c.name for c in table.columns]
+
+def load_table_frame(table, date_column, columns=None, tickers=None, start_date=None, end_date=None, chunk_rows=DB_FETCH_CHUNK_ROWS):
+    """
+    Loads a table into a typed DataFrame with a Core select, fetched through a server-side cursor
+    in chunks of chunk_rows. Only the given columns are selected, optionally only rows of the
+    tickers and with date_column in [start_date, end_date] (inclusive).
+    Dates are returned as datetime64, numeric columns as float64 (int64 for integers without NULLs);
+    dimension keys (e.g. product_id) are mapped back to their values (product).
+    """
+    columns = columns or frame_columns(table)
+    # Column stored in the table for each requested column
+    stored = {name: f"{name}_id" if name in DIMENSION_TABLES and f"{name}_id" in table.c else name for name in columns}
+
+    stmt = select(*[select_column(table.c[stored[name]]) for name in columns])
+    if tickers is not None:
+        stmt = stmt.where(table.c.ticker.in_(list(tickers)))
+    if start_date is not None:
+        stmt = stmt.where(table.c[date_column] >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(table.c[date_column] <= end_date)
+
+    chunks = {name: [] for name in columns}
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(stmt)
+        for rows in result.partitions(chunk_rows):
+            for name, values in zip(columns, zip(*rows)):
+                chunks[name].append(column_array(table.c[stored[name]], values))
+
+    frame = {}
+    for name in columns:
+        column = table.c[stored[name]]
+        values = np.concatenate(chunks[name]) if chunks[name] else column_array(column, [])
+        if stored[name] != name:
+            values = pd.Series(values).map(load_dimension(name)).to_numpy(dtype=object)
+        elif isinstance(column.type, Date):
+            values = values.astype("datetime64[ns]")
+        elif isinstance(column.type, Integer) and not np.isnan(values).any():
+            values = values.astype(np.int64)
+        frame[name] = values
+
+    return pd.DataFrame(frame, columns=columns)
+
+def load_portfolio_performance_from_db(columns=None, tickers=None, start_date=None, end_date=None):
+    """Loads portfolio_performance_daily, optionally projected and filtered on ticker and end_date."""
+    return load_table_frame(PortfolioPerformanceDailyTable.__table__, 'end_date', columns, tickers, start_date, end_date)
+
+def load_stock_prices_from_db(columns=None, tickers=None, start_date=None, end_date=None):
+    """Loads stock_prices, optionally projected and filtered on ticker and date."""
+    return load_table_frame(StockPricesTable.__table__, 'date', columns, tickers, start_date, end_date)
+
+def upsert_values(df, table, index_elements):
+    """Upsert a DataFrame into table with one INSERT ... VALUES ... ON CONFLICT DO UPDATE statement."""
     db = SessionLocal()
     try:
-        rows = db.query(PortfolioPerformanceDailyTable).all()
+        records = df.to_dict(orient="records")
+
+        stmt = insert(table).values(records)
+        update_cols = {c.name: c for c in stmt.excluded if c.name not in index_elements}
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_=update_cols
+        )
 
-        # Extract dicts, excluding _sa_instance_state
-        data = [
-            {k: v for k, v in r.__dict__.items() if k != "_sa_instance_state"}
+        db.execute(stmt)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def copy_upsert(df, table, index_elements, chunk_rows=DB_COPY_CHUNK_ROWS, conn=None):
+    """
+    Bulk upsert a DataFrame into table: the rows are streamed with COPY FROM STDIN (in CSV chunks
+    of chunk_rows) into a temporary staging table, which is merged with a single
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE. Runs in one transaction, or in the
+    transaction of conn when given.
+    Stored rows whose values are unchanged are not rewritten.
+    Returns (inserted, updated, skipped) row counts.
+    """
+    if df.empty:
+        return 0, 0, 0
+
+    columns = [c.name for c in table.columns if c.name in df.columns]
+    # ON CONFLICT can't update the same row twice within one statement
+    df = df[columns].drop_duplicates(subset=index_elements, keep="last")
+
+    staging = Table(
+        f"staging_{table.name}_{uuid.uuid4().hex[:8]}", MetaData(),
+        *[Column(c.name, c.type) for c in table.columns if c.name in columns],
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP"
+    )
+
+    stmt = insert(table).from_select(columns, select(*[staging.c[name] for name in columns]))
+    value_columns = [name for name in columns if name not in index_elements]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={name: stmt.excluded[name] for name in value_columns},
+        where=tuple_(*[table.c[name] for name in value_columns]).is_distinct_from(
+            tuple_(*[stmt.excluded[name] for name in value_columns])
+        )
+    )
+    # xmax is 0 for freshly inserted rows
+    stmt = stmt.returning(literal_column("xmax = 0"))
+    copy_sql = f'COPY {staging.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+
+    if conn is None:
+        with engine.begin() as conn:
+            return copy_upsert(df, table, index_elements, chunk_rows, conn)
+
+    staging.create(conn)
+    cursor = conn.connection.cursor()
+    try:
+        for i in range(0, len(df), chunk_rows):
+            buffer = io.StringIO()
+            df.iloc[i:i + chunk_rows].to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+    finally:
+        cursor.close()
+    written = conn.execute(stmt).scalars().all()
+
+    inserted = sum(1 for is_insert in written if is_insert)
+    return inserted, len(written) - inserted, len(df) - len(written)
+
+def save_portfolio_performance_to_db(df, delete_from=None):
+    """
+    Upserts portfolio_performance_daily rows. delete_from ({ticker: date}) first deletes the stored rows
+    of each ticker on or after the date, in the same transaction: the rows are only gone once their
+    recalculated replacements are written.
+    """
+    # 'ticker' and 'end_date' are the PK
+    table = PortfolioPerformanceDailyTable.__table__
+    df = encode_dimensions(df, table)
+    with engine.begin() as conn:
+        if delete_from:
+            delete_portfolio_performance_from_dates(delete_from, conn)
+        return copy_upsert(df, table, ['ticker', 'end_date'], conn=conn)
+
+def delete_portfolio_performance_from_dates(ticker_start_dates, conn=None):
+    """
+    Deletes portfolio_performance_daily rows of each ticker on or after the given date.
+    ticker_start_dates: {ticker: date}
+    Runs in its own transaction, or in the transaction of conn when given.
+    """
+    if conn is None:
+        with engine.begin() as conn:
+            return delete_portfolio_performance_from_dates(ticker_start_dates, conn)
+
+    table = PortfolioPerformanceDailyTable.__table__
+    for ticker, start_date in ticker_start_dates.items():
+        conn.execute(table.delete().where(table.c.ticker == ticker, table.c.end_date >= start_date))
+
+def save_stock_prices_to_db(df):
+    # 'ticker' and 'date' are the PK
+    table = StockPricesTable.__table__
+    return copy_upsert(encode_dimensions(df, table), table, ['ticker', 'date'])
+
+def load_position_snapshots(as_of_date):
+    """
+    Loads the latest position snapshot on or before as_of_date of every ticker.
+    Returns {ticker: (date, state)} with state ordered like LEDGER_STATE_FIELDS.
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(PositionSnapshotsTable)
+            .filter(PositionSnapshotsTable.date <= as_of_date)
+            .distinct(PositionSnapshotsTable.ticker)
+            .order_by(PositionSnapshotsTable.ticker, PositionSnapshotsTable.date.desc())
+            .all()
+        )
+
+        return {
+            r.ticker: (r.date, tuple(getattr(r, field) for field in LEDGER_STATE_FIELDS))
             for r in rows
-        ]
+        }
 
-        if not data:
-            # Get column names from the SQLAlchemy model
-            columns = [c.name for c in PortfolioPerformanceDailyTable.__table__.columns]
-            # Return empty DataFrame with these columns
-            return pd.DataFrame(columns=columns)
+    finally:
+        db.close()
 
-        return pd.DataFrame(data)
+def save_position_snapshots_to_db(df):
+    # 'ticker' and 'date' are the PK
+    return copy_upsert(df, PositionSnapshotsTable.__table__, ['ticker', 'date'])
 
+def delete_position_snapshots_from_dates(ticker_start_dates):
+    """
+    Deletes position_snapshots of each ticker on or after the given date,
+    e.g. from the earliest changed transaction date onwards.
+    ticker_start_dates: {ticker: date}
+    """
+    db = SessionLocal()
+    try:
+        for ticker, start_date in ticker_start_dates.items():
+            db.query(PositionSnapshotsTable).filter(
+                PositionSnapshotsTable.ticker == ticker,
+                PositionSnapshotsTable.date >= start_date
+            ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def load_price_watermarks():
+    """Returns the finalized-through date per ticker: {ticker: date}."""
+    db = SessionLocal()
+    try:
+        return {r.ticker: r.finalized_through for r in db.query(PriceWatermarksTable).all()}
     finally:
         db.close()
 
-def load_stock_prices_from_db():
+def load_stale_price_tickers(refreshed_before):
+    """Returns the tickers whose full price history was last fetched before refreshed_before."""
     db = SessionLocal()
     try:
-        rows = db.query(StockPricesTable).all()
+        rows = db.query(PriceWatermarksTable.ticker).filter(
+            PriceWatermarksTable.refreshed_at.is_(None) | (PriceWatermarksTable.refreshed_at < refreshed_before)
+        ).all()
+        return [r.ticker for r in rows]
+    finally:
+        db.close()
 
-        # Extract dicts, excluding _sa_instance_state
-        data = [
-            {k: v for k, v in r.__dict__.items() if k != "_sa_instance_state"}
-            for r in rows
+def save_price_watermarks(watermarks, refreshed=()):
+    """
+    Upserts the finalized-through date per ticker.
+    watermarks: {ticker: date}
+    refreshed: tickers whose full price history was fetched in this run; the others keep their refreshed_at.
+    """
+    if not watermarks:
+        return
+
+    db = SessionLocal()
+    try:
+        updated_at = datetime.now(timezone.utc)
+        refreshed = set(refreshed)
+        records = [
+            {
+                "ticker": ticker,
+                "finalized_through": finalized_through,
+                "updated_at": updated_at,
+                "refreshed_at": updated_at if ticker in refreshed else None,
+            }
+            for ticker, finalized_through in watermarks.items()
         ]
+        table = PriceWatermarksTable.__table__
+
+        stmt = insert(table).values(records)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['ticker'],
+            set_={
+                "finalized_through": stmt.excluded.finalized_through,
+                "updated_at": stmt.excluded.updated_at,
+                "refreshed_at": func.coalesce(stmt.excluded.refreshed_at, table.c.refreshed_at),
+            }
+        )
+
+        db.execute(stmt)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
-        if not data:
-            # Get column names from the SQLAlchemy model
-            columns = [c.name for c in StockPricesTable.__table__.columns]
-            # Return empty DataFrame with these columns
-            return pd.DataFrame(columns=columns)
+def load_fx_rates_from_db(currency_pairs, start_date, end_date):
+    """Loads the fx_rates of the currency pairs in [start_date, end_date) as a DataFrame."""
+    db = SessionLocal()
+    try:
+        rows = db.query(FxRatesTable.currency_pair, FxRatesTable.date, FxRatesTable.rate).filter(
+            FxRatesTable.currency_pair.in_(list(currency_pairs)),
+            FxRatesTable.date >= start_date,
+            FxRatesTable.date < end_date
+        ).all()
 
-        return pd.DataFrame(data)
+        return pd.DataFrame(rows, columns=["currency_pair", "date", "rate"])
 
     finally:
         db.close()
-        
-def save_portfolio_performance_to_db(df):
+
+def save_fx_rates_to_db(df):
+    # 'currency_pair' and 'date' are the PK
+    return copy_upsert(df, FxRatesTable.__table__, ['currency_pair', 'date'])
+
+def load_fx_rate_coverage(currency_pairs):
+    """Returns the covered [start_date, end_date) range per currency pair: {currency_pair: (start_date, end_date)}."""
     db = SessionLocal()
     try:
-        records = df.to_dict(orient="records")
-        table = PortfolioPerformanceDailyTable.__table__
+        rows = db.query(FxRateCoverageTable).filter(
+            FxRateCoverageTable.currency_pair.in_(list(currency_pairs))
+        ).all()
 
-        stmt = insert(table).values(records)
-        update_cols = {c.name: c for c in stmt.excluded if c.name not in ['ticker', 'end_date']}
-        # Assumes 'ticker' and 'end_date' are PK, exclude them from update
+        return {r.currency_pair: (r.start_date, r.end_date) for r in rows}
+
+    finally:
+        db.close()
+
+def save_fx_rate_coverage(coverage):
+    """
+    Upserts the covered range per currency pair.
+    coverage: {currency_pair: (start_date, end_date)}
+    """
+    if not coverage:
+        return
+
+    db = SessionLocal()
+    try:
+        records = [
+            {"currency_pair": currency_pair, "start_date": start_date, "end_date": end_date}
+            for currency_pair, (start_date, end_date) in coverage.items()
+        ]
+        table = FxRateCoverageTable.__table__
 
+        stmt = insert(table).values(records)
         stmt = stmt.on_conflict_do_update(
-            index_elements=['ticker', 'end_date'],
-            set_=update_cols
+            index_elements=['currency_pair'],
+            set_={"start_date": stmt.excluded.start_date, "end_date": stmt.excluded.end_date}
         )
 
         db.execute(stmt)
@@ -167,20 +496,52 @@ def save_portfolio_performance_to_db(df):
     finally:
         db.close()
 
-def save_stock_prices_to_db(df):
+def load_portfolio_metadata():
+    """Returns the portfolio_metadata row as a dict, or None before the first calculation."""
     db = SessionLocal()
     try:
-        records = df.to_dict(orient="records")
-        table = StockPricesTable.__table__
+        row = db.query(PortfolioMetadataTable).filter(PortfolioMetadataTable.id == 1).one_or_none()
+        if row is None:
+            return None
 
-        stmt = insert(table).values(records)
-        update_cols = {c.name: c for c in stmt.excluded if c.name not in ['ticker', 'date']}
-        # 'ticker' and 'date' as PK, exclude from update
+        return {
+            "products": list(row.products or []),
+            "min_date": row.min_date,
+            "max_date": row.max_date,
+            "calculated_at": row.calculated_at,
+            "data_version": row.data_version,
+        }
 
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['ticker', 'date'],
-            set_=update_cols
+    finally:
+        db.close()
+
+def save_portfolio_metadata(products, min_date, max_date, data_changed=True):
+    """
+    Upserts the portfolio_metadata row. With data_changed the data version is increased;
+    new versions are at least the current time in ms, so they keep increasing after the table is reset.
+    """
+    db = SessionLocal()
+    try:
+        calculated_at = datetime.now(timezone.utc)
+        table = PortfolioMetadataTable.__table__
+
+        stmt = insert(table).values(
+            id=1,
+            products=list(products),
+            min_date=min_date,
+            max_date=max_date,
+            calculated_at=calculated_at,
+            data_version=int(calculated_at.timestamp() * 1000)
         )
+        set_ = {
+            "products": stmt.excluded.products,
+            "min_date": stmt.excluded.min_date,
+            "max_date": stmt.excluded.max_date,
+            "calculated_at": stmt.excluded.calculated_at,
+        }
+        if data_changed:
+            set_["data_version"] = func.greatest(table.c.data_version + 1, stmt.excluded.data_version)
+        stmt = stmt.on_conflict_do_update(index_elements=['id'], set_=set_)
 
         db.execute(stmt)
         db.commit()
@@ -188,4 +549,4 @@ def save_stock_prices_to_db(df):
         db.rollback()
         raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the portfolio_performance_daily write paths: the single INSERT ... VALUES upsert
+against the COPY + staging table upsert. Runs against the configured database on a scratch
+copy of the table, which is dropped afterwards.
+
+    python -m backend.utils.db_benchmark --rows 100000 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, MetaData, PrimaryKeyConstraint, Table
+from backend.models.portfolio_daily import PortfolioPerformanceDailyTable
+from backend.utils.db import engine, upsert_values, copy_upsert
+from backend.utils.logger import app_logger
+
+INDEX_ELEMENTS = ['ticker', 'end_date']
+
+def make_rows(n_rows, n_tickers=200, seed=0):
+    """Synthetic portfolio_performance_daily rows: n_tickers tickers over consecutive days."""
+    rng = np.random.default_rng(seed)
+    n_days = -(-n_rows // n_tickers)
+    days = pd.date_range("2000-01-03", periods=n_days, freq="D").date
+
+    df = pd.DataFrame({
+        "ticker": np.tile([f"T{i}" for i in range(n_tickers)], n_days)[:n_rows],
+        "end_date": np.repeat(days, n_tickers)[:n_rows],
+    })
+    df["product_id"] = df["ticker"].str[1:].astype(int)
+    df["start_date"] = days[0]
+    df["quantity"] = rng.integers(0, 1000, n_rows)
+    for column in ['avg_cost', 'cost_basis', 'total_cost', 'transaction_costs', 'current_value',
+                   'current_money_weighted_return', 'realized_return', 'net_return',
+                   'current_performance_percentage', 'net_performance_percentage']:
+        df[column] = rng.normal(1000, 250, n_rows).round(2)
+    return df
+
+def time_write(label, write, df):
+    start = time.time()
+    try:
+        write(df)
+    except Exception as e:
+        app_logger.warning(f"[DB-BENCH] {label}: failed after {round(time.time() - start, 2)}s ({type(e).__name__}: {e})")
+        return None
+    elapsed = time.time() - start
+    app_logger.info(f"[DB-BENCH] {label}: {len(df)} rows in {round(elapsed, 2)}s ({int(len(df) / elapsed)} rows/s)")
+    return elapsed
+
+def run_benchmark(row_counts):
+    metadata = MetaData()
+    # Same columns and primary key, without the foreign key to products
+    table = Table(
+        "bench_portfolio_performance_daily", metadata,
+        *[Column(c.name, c.type) for c in PortfolioPerformanceDailyTable.__table__.columns],
+        PrimaryKeyConstraint(*INDEX_ELEMENTS)
+    )
+    results = []
+
+    try:
+        for n_rows in row_counts:
+            df = make_rows(n_rows)
+            # Unchanged rows aren't rewritten by the copy path, so the update pass changes a value
+            changed_df = df.assign(current_value=df['current_value'] + 1)
+            for path, write in [
+                ("values", lambda rows: upsert_values(rows, table, INDEX_ELEMENTS)),
+                ("copy", lambda rows: copy_upsert(rows, table, INDEX_ELEMENTS)),
+            ]:
+                metadata.drop_all(engine)
+                metadata.create_all(engine)
+                # First write inserts every row, the second one updates every row
+                insert_time = time_write(f"{path} insert", write, df)
+                update_time = time_write(f"{path} update", write, changed_df) if insert_time is not None else None
+                results.append({"rows": n_rows, "path": path, "insert_s": insert_time, "update_s": update_time})
+    finally:
+        metadata.drop_all(engine)
+
+    return pd.DataFrame(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the portfolio_performance_daily upsert paths.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(run_benchmark(args.rows).to_string(index=False))
@@ -3,7 +3,6 @@ import numpy as np
 from supabase import create_client, Client
 import os
 import time
-import decimal
 from datetime import date, datetime
 from backend.utils.logger import app_logger
 
@@ -50,17 +49,19 @@ class DB_Supabase:
         
         df = df.copy()
 
-        # Convert datetime and date columns to ISO format
+        # Convert datetime and date columns to ISO format (dates without a time as YYYY-MM-DD)
         for col in df.columns:
             if pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = df[col].apply(lambda x: x.isoformat() if pd.notnull(x) else None)
+                values = df[col].dropna()
+                if (values == values.dt.normalize()).all():
+                    df[col] = df[col].dt.strftime('%Y-%m-%d').astype(object).where(df[col].notna(), None)
+                else:
+                    df[col] = df[col].apply(lambda x: x.isoformat() if pd.notnull(x) else None)
             elif df[col].apply(lambda x: isinstance(x, (date, datetime))).any():
                 df[col] = df[col].apply(lambda x: x.isoformat() if pd.notnull(x) else None)
 
-        # Convert Decimal columns to float
-        for col in df.columns:
-            if df[col].apply(lambda x: isinstance(x, decimal.Decimal)).any():
-                df[col] = df[col].apply(lambda x: float(x) if pd.notnull(x) else None)
+        # NaN (NULL in the local DB) isn't valid JSON
+        df = df.astype(object).where(df.notna(), None)
 
         data = df.to_dict(orient='records')
 
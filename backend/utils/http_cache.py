@@ -0,0 +1,33 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from fastapi import Response
+
+def data_cache_headers(metadata, *variant):
+    """
+    ETag and Last-Modified headers of a /data response, derived from the data version in the
+    portfolio_metadata row (plus any variant parts, e.g. the response format).
+    No headers before the first calculation, so those responses are never revalidated.
+    """
+    if not metadata or metadata.get("data_version") is None:
+        return {}
+
+    etag = "-".join(str(part) for part in (metadata["data_version"], *variant) if part is not None)
+    # Data versions are the time of the change in ms (see save_portfolio_metadata)
+    last_modified = datetime.fromtimestamp(metadata["data_version"] / 1000, tz=timezone.utc)
+    return {
+        "ETag": f'"{etag}"',
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        # Clients may keep the response, but have to revalidate it on every use
+        "Cache-Control": "no-cache",
+    }
+
+def is_not_modified(headers, if_none_match):
+    """Whether the If-None-Match header matches the ETag in headers."""
+    etag = headers.get("ETag")
+    if not etag or not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified_response(headers):
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,105 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+from types import MappingProxyType
+
+MAPPING_FILE = 'output/isin_mapping.json'
+
+# Cached mapping and lookups, rebuilt when the file's (mtime, size) signature changes
+_lock = threading.Lock()
+_cache = None
+
+def _file_signature():
+    try:
+        stat = os.stat(MAPPING_FILE)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _build_cache(mapping, signature):
+    return {
+        "signature": signature,
+        "mapping": mapping,
+        "ticker_to_name": MappingProxyType({
+            data.get("ticker"): data.get("display_name", "")
+            for data in mapping.values()
+            if "ticker" in data
+        }),
+        "isin_to_ticker": MappingProxyType({
+            isin: data.get("ticker", "")
+            for isin, data in mapping.items()
+        }),
+        "ticker_to_product_type": MappingProxyType({
+            data.get("ticker"): data.get("product_type", "")
+            for data in mapping.values()
+            if "ticker" in data
+        }),
+    }
+
+def _get_cache():
+    global _cache
+    signature = _file_signature()
+
+    with _lock:
+        if _cache is None or _cache["signature"] != signature:
+            mapping = {}
+            if signature is not None:
+                with open(MAPPING_FILE, 'r') as f:
+                    mapping = json.load(f)
+            _cache = _build_cache(mapping, signature)
+        return _cache
+
+def mapping_exists() -> bool:
+    return os.path.exists(MAPPING_FILE)
+
+def get_isin_mapping() -> dict:
+    """Returns a copy of the ISIN mapping ({isin: {...}}), safe to modify and save."""
+    return copy.deepcopy(_get_cache()["mapping"])
+
+def get_ticker_to_name():
+    """Read-only {ticker: display_name} lookup."""
+    return _get_cache()["ticker_to_name"]
+
+def get_isin_to_ticker():
+    """Read-only {isin: ticker} lookup."""
+    return _get_cache()["isin_to_ticker"]
+
+def get_ticker_to_product_type():
+    """Read-only {ticker: product_type} lookup."""
+    return _get_cache()["ticker_to_product_type"]
+
+def get_mapping_version():
+    """(mtime, size) signature of the mapping file, changes whenever it is saved; None without a mapping."""
+    return _file_signature()
+
+def save_isin_mapping(mapping: dict):
+    """
+    Atomically writes the mapping to the JSON file (temp file + rename)
+    and refreshes the cached lookups.
+    """
+    global _cache
+    directory = os.path.dirname(MAPPING_FILE) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    with _lock:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.isin_mapping.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(mapping, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp creates the file as 0600: keep the mode of the file it replaces (0644 for a new one)
+            os.chmod(tmp_path, os.stat(MAPPING_FILE).st_mode & 0o777 if os.path.exists(MAPPING_FILE) else 0o644)
+            os.replace(tmp_path, MAPPING_FILE)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        _cache = _build_cache(copy.deepcopy(mapping), _file_signature())
+
+def delete_isin_mapping():
+    """Removes the mapping file; the cache is reset on the next read."""
+    os.remove(MAPPING_FILE)
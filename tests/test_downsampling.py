@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from backend.services.downsampling import downsample_frame, lttb_indices, minmax_indices
+
+def make_series(size=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(size), np.cumsum(rng.normal(size=size))
+
+def test_lttb_keeps_both_ends():
+    x, y = make_series()
+    picked = lttb_indices(x, y, 100)
+
+    assert len(picked) <= 100
+    assert picked[0] == 0 and picked[-1] == len(x) - 1
+
+def test_minmax_keeps_extremes_and_pairs_points():
+    x, y = make_series()
+
+    assert np.argmin(y) in minmax_indices(x, y, 100)
+    assert np.argmax(y) in minmax_indices(x, y, 100)
+    # One (min, max) pair per bucket: an odd n rounds down
+    assert len(minmax_indices(x, y, 3)) == 2
+
+def test_downsample_frame_sorts_and_keeps_ends():
+    x, y = make_series()
+    frame = pd.DataFrame({"End Date": pd.date_range("2015-01-01", periods=len(x)), "value": y})
+
+    downsampled = downsample_frame(frame.sample(frac=1, random_state=0), 300, ["value"], "End Date")
+
+    assert len(downsampled) <= 300
+    assert downsampled["End Date"].is_monotonic_increasing
+    assert downsampled["End Date"].iloc[0] == frame["End Date"].iloc[0]
+    assert downsampled["End Date"].iloc[-1] == frame["End Date"].iloc[-1]
+    assert list(downsampled.index) == list(lttb_indices(x, y, 300))
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import backend.services.fx_rates as fx_rates
+from backend.services.fx_rates import convert_prices, load_fx_rates
+
+FX_RATES = pd.DataFrame({
+    "currency_pair": ["USD-EUR", "USD-EUR"],
+    "date": [date(2024, 1, 2), date(2024, 1, 4)],
+    "rate": [0.9, 0.8],
+})
+
+def test_convert_prices_uses_last_known_rate():
+    prices = pd.DataFrame({
+        "ticker": ["US", "US", "US", "EU"],
+        "date": [date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 5), date(2024, 1, 3)],
+        "price": [10.0, 10.0, 10.0, 5.0],
+    })
+    converted = convert_prices(prices, {"US": "USD", "EU": "EUR"}, FX_RATES, "EUR").set_index(["ticker", "date"])
+
+    # Before the first rate the first rate is used, after it the last rate on or before the day
+    assert converted.loc[("US", pd.Timestamp(2024, 1, 1)), "fx_rate"] == 0.9
+    assert converted.loc[("US", pd.Timestamp(2024, 1, 3)), "price"] == pytest.approx(9.0)
+    assert converted.loc[("US", pd.Timestamp(2024, 1, 5)), "price"] == pytest.approx(8.0)
+    assert converted.loc[("EU", pd.Timestamp(2024, 1, 3)), "fx_rate"] == 1.0
+
+def test_convert_prices_skips_tickers_without_rates():
+    prices = pd.DataFrame({
+        "ticker": ["GB", "EU"],
+        "date": [date(2024, 1, 3), date(2024, 1, 3)],
+        "price": [7.0, 5.0],
+    })
+    converted = convert_prices(prices, {"GB": "GBP", "EU": "EUR"}, FX_RATES, "EUR")
+
+    assert list(converted["ticker"]) == ["EU"]
+
+class EmptyRateProvider:
+    def get_prices_with_failures(self, tickers, start, end):
+        return {ticker: {} for ticker in tickers}, set()
+
+def test_load_fx_rates_keeps_coverage_without_rates(monkeypatch):
+    saved_coverage = {}
+    monkeypatch.setattr(fx_rates, "load_fx_rate_coverage", lambda pairs: {})
+    monkeypatch.setattr(fx_rates, "save_fx_rates_to_db", lambda df: (0, 0, 0))
+    monkeypatch.setattr(fx_rates, "save_fx_rate_coverage", saved_coverage.update)
+    monkeypatch.setattr(fx_rates, "load_fx_rates_from_db", lambda pairs, start, end: pd.DataFrame(columns=fx_rates.FX_RATE_COLUMNS))
+
+    _, coverage = load_fx_rates(["USD"], "EUR", date(2024, 1, 1), date(2024, 2, 1), EmptyRateProvider(), date(2024, 1, 31))
+
+    assert coverage == {}
+    assert saved_coverage == {}
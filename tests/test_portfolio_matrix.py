@@ -0,0 +1,243 @@
+"""
+Regression tests for the portfolio calculation engines.
+
+The vectorized (day x stock) matrix of calculate_daily_performance and the ledger-based
+calculate_mwr must give the same rows as the original per-day loop, which re-filtered all
+transactions and re-summed every BUY on each SELL. That loop is kept here as the reference.
+"""
+from datetime import date, time as dt_time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backend.services.portfolio_analyzer as portfolio_analyzer
+from backend.services.portfolio_analyzer import PortfolioAnalyzer
+from backend.services.portfolio_matrix import RESULT_COLUMNS
+from backend.services.price_provider import FilePriceProvider
+from backend.services.price_series import PriceSeries
+
+START_DATE = date(2024, 1, 1)
+END_DATE = date(2024, 3, 1)
+
+TICKER_TO_NAME = {"AAA": "Alpha", "BBB": "Beta", "CCC": "Gamma"}
+
+METRIC_COLUMNS = [column for column in RESULT_COLUMNS if column not in ("product", "ticker", "start_date", "end_date")]
+
+# (date, time, stock, quantity, price, transaction costs)
+TRANSACTIONS = [
+    # AAA: two buys, a partial sell, a full exit, a re-buy and a partial sell of the new position
+    (date(2024, 1, 2), dt_time(9, 30), "AAA", 10, 100.0, -2.0),
+    (date(2024, 1, 10), dt_time(10, 0), "AAA", 5, 110.0, -2.0),
+    (date(2024, 1, 17), dt_time(11, 0), "AAA", -8, 120.0, -2.5),
+    (date(2024, 1, 24), dt_time(15, 45), "AAA", -7, 95.0, -2.5),
+    (date(2024, 2, 7), dt_time(9, 5), "AAA", 4, 90.0, -1.0),
+    (date(2024, 2, 14), dt_time(14, 0), "AAA", -1, 98.0, -1.0),
+    # BBB: held through a gap in the prices, then fully sold and never re-bought
+    (date(2024, 1, 3), dt_time(12, 0), "BBB", 20, 50.0, -3.0),
+    (date(2024, 1, 8), dt_time(12, 0), "BBB", 5, 48.0, -1.0),
+    (date(2024, 2, 1), dt_time(16, 0), "BBB", -25, 55.0, -3.0),
+    # CCC: first traded before its first price, two transactions on the same day
+    (date(2024, 1, 22), dt_time(9, 0), "CCC", 3, 200.0, -1.5),
+    (date(2024, 1, 22), dt_time(16, 30), "CCC", -1, 205.0, -1.5),
+    (date(2024, 2, 20), dt_time(10, 0), "CCC", 2, 190.0, -1.5),
+]
+
+def make_transactions(rows):
+    return pd.DataFrame([
+        {
+            "Date": day,
+            "Time": moment,
+            "Stock": stock,
+            "Quantity": quantity,
+            "Cost": -quantity * price,
+            "Transaction_costs": transaction_costs,
+            "Action": "BUY" if quantity > 0 else "SELL",
+            "Currency": "EUR",
+            "ISIN": f"ISIN-{stock}",
+            "Price": price,
+        }
+        for day, moment, stock, quantity, price, transaction_costs in rows
+    ])
+
+def weekdays(start, end):
+    return [day.date() for day in pd.bdate_range(start, end)]
+
+def make_prices():
+    """Daily closes with gaps: missing days, NaN prices and a ticker whose prices start late."""
+    days = weekdays(START_DATE, END_DATE)
+    aaa = {day: 100.0 + i for i, day in enumerate(days)}
+    bbb = {day: 50.0 - 0.5 * i for i, day in enumerate(days) if not date(2024, 1, 12) <= day <= date(2024, 1, 26)}
+    bbb[date(2024, 1, 9)] = float("nan")
+    ccc = {day: 210.0 - i for i, day in enumerate(days) if day >= date(2024, 1, 29)}
+    return {"AAA": aaa, "BBB": bbb, "CCC": ccc}
+
+def reference_mwr(transactions, stock, start_date, end_date, stock_price_data):
+    """The per-transaction calculate_mwr as it was before the PositionLedger, including its O(n^2) SELL handling."""
+    stock_price_data = {k: v for k, v in stock_price_data.items() if v == v}
+
+    all_transactions = transactions[
+        (transactions["Date"] <= end_date) & (transactions["Stock"] == stock)
+    ].sort_values(by=["Date", "Time"])
+
+    buys = all_transactions[all_transactions["Action"] == "BUY"]
+    quantity_bought = buys["Quantity"].sum()
+    avg_cost = -1 * (buys["Cost"].sum() / quantity_bought) if quantity_bought > 0 else 0
+
+    realized_return = 0
+    quantity_held = 0
+    purchase_cost = 0
+    transaction_costs_total = 0
+
+    for _, row in all_transactions.iterrows():
+        action, quantity, transaction_costs = row["Action"], row["Quantity"], row["Transaction_costs"]
+        transaction_price = abs(row["Cost"]) / abs(row["Quantity"])
+
+        if action == "BUY":
+            purchase_cost += quantity * transaction_price
+            quantity_held += quantity
+            realized_return += transaction_costs
+            transaction_costs_total += -1 * transaction_costs
+        elif action == "SELL" and quantity_held > 0:
+            stock_buys = all_transactions[all_transactions["Action"] == "BUY"]
+            avg_cost_stock = -1 * (stock_buys["Cost"].sum() / stock_buys["Quantity"].sum())
+            transaction_costs_total += -1 * transaction_costs
+            quantity_held -= abs(quantity)
+            realized_return += abs(quantity) * (transaction_price - avg_cost_stock) + transaction_costs
+
+    if quantity_held > 0:
+        open_days = [day for day in stock_price_data if start_date <= day <= end_date]
+        end_price = stock_price_data.get(max(open_days), 0) if open_days else 0
+        current_return = (quantity_held * end_price) - (quantity_held * avg_cost)
+    else:
+        current_return = 0
+
+    cost_basis = quantity_held * avg_cost
+    net_return = current_return + realized_return
+    current_value = cost_basis + current_return
+    current_performance_percentage = (current_return / cost_basis) * 100 if (current_return and cost_basis) else 0
+    net_performance_percentage = ((current_return + realized_return) / purchase_cost) * 100 if purchase_cost else 0
+
+    return {
+        "product": TICKER_TO_NAME.get(stock, ""),
+        "ticker": stock,
+        "quantity": int(quantity_held),
+        "start_date": start_date,
+        "end_date": end_date,
+        "avg_cost": round(avg_cost, 2),
+        "cost_basis": round(cost_basis, 2),
+        "total_cost": round(purchase_cost, 2),
+        "transaction_costs": round(transaction_costs_total, 2),
+        "current_value": round(current_value, 2),
+        "current_money_weighted_return": round(current_return, 2),
+        "realized_return": round(realized_return, 2),
+        "net_return": round(net_return, 2),
+        "current_performance_percentage": round(current_performance_percentage, 2),
+        "net_performance_percentage": round(net_performance_percentage, 2),
+    }
+
+def per_day_loop(analyzer, transactions, start_date, end_dates, stock_prices):
+    """Rows of the per-day loop: calculate_all_stocks_mwr for every day with transactions on or before it."""
+    rows = []
+    for end_date in end_dates:
+        stocks = list(transactions.loc[transactions["Date"] <= end_date, "Stock"].unique())
+        if not stocks:
+            continue
+        result = analyzer.calculate_all_stocks_mwr(stocks, start_date, end_date, stock_prices)
+        for values in result.values():
+            values["end_date"] = end_date
+            rows.append(values)
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+def sort_rows(df):
+    return df.sort_values(["end_date", "ticker"]).reset_index(drop=True)
+
+def assert_rows_equal(actual, expected):
+    actual, expected = sort_rows(actual), sort_rows(expected)
+    assert len(actual) == len(expected)
+    pd.testing.assert_frame_equal(
+        actual[["product", "ticker", "start_date", "end_date"]],
+        expected[["product", "ticker", "start_date", "end_date"]],
+    )
+    for column in METRIC_COLUMNS:
+        np.testing.assert_allclose(
+            actual[column].astype(float), expected[column].astype(float), atol=0.011, err_msg=column
+        )
+
+@pytest.fixture(autouse=True)
+def ticker_names(monkeypatch):
+    monkeypatch.setattr(portfolio_analyzer, "get_ticker_to_name", lambda: TICKER_TO_NAME)
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return PortfolioAnalyzer(make_transactions(TRANSACTIONS), price_provider=FilePriceProvider(str(tmp_path)))
+
+@pytest.fixture
+def stock_prices():
+    return {stock: PriceSeries.from_dict(prices) for stock, prices in make_prices().items()}
+
+def test_calculate_mwr_matches_reference(analyzer, stock_prices):
+    raw_prices = make_prices()
+    for end_date in weekdays(START_DATE, END_DATE):
+        for stock in TICKER_TO_NAME:
+            if not (analyzer.transactions.loc[analyzer.transactions["Stock"] == stock, "Date"] <= end_date).any():
+                continue
+            expected = reference_mwr(analyzer.transactions, stock, START_DATE, end_date, raw_prices[stock])
+            actual = analyzer.calculate_mwr(stock, START_DATE, end_date, stock_prices[stock])
+            assert actual == pytest.approx(expected, abs=0.011), (stock, end_date)
+
+def test_matrix_matches_per_day_loop(analyzer, stock_prices):
+    end_dates = weekdays(START_DATE, END_DATE)
+    expected = per_day_loop(analyzer, analyzer.transactions, START_DATE, end_dates, stock_prices)
+    actual, _ = analyzer.calculate_daily_performance(list(TICKER_TO_NAME), START_DATE, end_dates, stock_prices)
+
+    assert_rows_equal(actual, expected)
+
+def test_matrix_covers_exits_and_gaps(analyzer, stock_prices):
+    end_dates = weekdays(START_DATE, END_DATE)
+    rows, _ = analyzer.calculate_daily_performance(list(TICKER_TO_NAME), START_DATE, end_dates, stock_prices)
+    rows = rows.set_index(["ticker", "end_date"])
+
+    # Fully exited: no holdings, the realized return stays
+    assert rows.loc[("AAA", date(2024, 1, 31)), "quantity"] == 0
+    assert rows.loc[("AAA", date(2024, 1, 31)), "current_value"] == 0
+    assert rows.loc[("BBB", date(2024, 2, 29)), "quantity"] == 0
+    assert rows.loc[("BBB", date(2024, 2, 29)), "realized_return"] != 0
+    # Re-bought after the exit
+    assert rows.loc[("AAA", date(2024, 2, 14)), "quantity"] == 3
+    # During the price gap the last close before it is used
+    last_close = make_prices()["BBB"][date(2024, 1, 11)]
+    assert rows.loc[("BBB", date(2024, 1, 19)), "current_value"] == pytest.approx(25 * last_close, abs=0.011)
+    # Before its first price a ticker has no current value
+    assert rows.loc[("CCC", date(2024, 1, 24)), "current_value"] == 0
+
+def test_matrix_matches_reference_on_long_history(tmp_path):
+    rng = np.random.default_rng(0)
+    stocks = [f"T{i}" for i in range(5)]
+    start_date = date(2021, 1, 1)
+    end_dates = weekdays(start_date, start_date + timedelta(days=400))
+
+    rows = []
+    for stock in stocks:
+        held = 0
+        for day in sorted(rng.choice(end_dates, size=150)):
+            quantity = int(rng.integers(1, 20))
+            if held > 0 and rng.random() < 0.35:
+                quantity = -min(quantity, held)
+            held += quantity
+            rows.append((day, dt_time(12, 0), stock, quantity, float(rng.uniform(10, 100)), -1.0))
+    analyzer = PortfolioAnalyzer(make_transactions(rows), price_provider=FilePriceProvider(str(tmp_path)))
+    raw_prices = {stock: dict(zip(end_dates, rng.uniform(10, 100, len(end_dates)))) for stock in stocks}
+    stock_prices = {stock: PriceSeries.from_dict(prices) for stock, prices in raw_prices.items()}
+
+    actual, _ = analyzer.calculate_daily_performance(stocks, start_date, end_dates, stock_prices)
+
+    # The reference re-scans the transactions per row, so it is checked on every 20th day and the last one
+    sampled = set(end_dates[::20] + end_dates[-1:])
+    expected = pd.DataFrame([
+        reference_mwr(analyzer.transactions, stock, start_date, end_date, raw_prices[stock])
+        for end_date in sorted(sampled)
+        for stock in stocks
+        if (analyzer.transactions.loc[analyzer.transactions["Stock"] == stock, "Date"] <= end_date).any()
+    ], columns=RESULT_COLUMNS)
+    assert_rows_equal(actual[actual["end_date"].isin(sampled) & actual["ticker"].isin(stocks)], expected)
@@ -0,0 +1,56 @@
+from datetime import date
+
+import pandas as pd
+
+from backend.services.price_cache import PriceCache, CachedPriceProvider
+from backend.services.price_provider import PriceProvider
+
+class StaticProvider(PriceProvider):
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    def get_prices_with_failures(self, tickers, start, end):
+        self.requests.append((sorted(tickers), start, end))
+        return {
+            ticker: {day: price for day, price in self.prices.get(ticker, {}).items() if start <= day < end}
+            for ticker in tickers
+        }, []
+
+def test_coverage_follows_returned_prices(tmp_path):
+    source = StaticProvider({"AAA": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0}})
+    cache = PriceCache(str(tmp_path))
+    provider = CachedPriceProvider(source, cache, settled_through=date(2024, 1, 9))
+
+    provider.get_price_frame(["AAA", "BBB"], date(2024, 1, 1), date(2024, 1, 10))
+
+    # AAA is covered up to its last returned price, BBB answered without prices and is covered up to the settled day
+    assert cache.get_missing_spans("AAA", date(2024, 1, 1), date(2024, 1, 10)) == [(date(2024, 1, 4), date(2024, 1, 10))]
+    assert cache.get_missing_spans("BBB", date(2024, 1, 1), date(2024, 1, 11)) == [(date(2024, 1, 10), date(2024, 1, 11))]
+
+def test_delisted_ticker_is_not_refetched(tmp_path):
+    source = StaticProvider({"OLD": {date(2024, 1, 2): 10.0}})
+    cache = PriceCache(str(tmp_path))
+    CachedPriceProvider(source, cache, settled_through=date(2024, 1, 9)).get_price_frame(["OLD"], date(2024, 1, 1), date(2024, 1, 10))
+    CachedPriceProvider(source, cache, settled_through=date(2024, 1, 9)).get_price_frame(["OLD"], date(2024, 1, 1), date(2024, 1, 10))
+
+    # The second run asks once for the days after the last price, which come back empty and are covered from then on
+    assert [(start, end) for _, start, end in source.requests] == [
+        (date(2024, 1, 1), date(2024, 1, 10)),
+        (date(2024, 1, 3), date(2024, 1, 10)),
+    ]
+    CachedPriceProvider(source, cache, settled_through=date(2024, 1, 9)).get_price_frame(["OLD"], date(2024, 1, 1), date(2024, 1, 10))
+    assert len(source.requests) == 2
+
+def test_seed_covers_stored_prices(tmp_path):
+    cache = PriceCache(str(tmp_path))
+    stored = pd.DataFrame({
+        "ticker": ["AAA", "AAA"],
+        "date": pd.to_datetime([date(2024, 1, 2), date(2024, 1, 3)]),
+        "price": [10.0, 11.0],
+    })
+
+    cache.seed(stored, date(2024, 1, 1), {"AAA": date(2024, 1, 3)})
+
+    assert cache.get_missing_spans("AAA", date(2024, 1, 1), date(2024, 1, 10)) == [(date(2024, 1, 4), date(2024, 1, 10))]
+    assert list(cache.read(["AAA"], date(2024, 1, 1), date(2024, 1, 10))["price"]) == [10.0, 11.0]
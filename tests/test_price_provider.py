@@ -0,0 +1,49 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import backend.services.price_provider as price_provider
+from backend.services.price_provider import PriceProvider, YFinanceProvider
+
+def make_download(closes):
+    """Frame shaped like yf.download(group_by="ticker"): (Ticker, Price) columns per returned ticker."""
+    index = pd.to_datetime([date(2024, 1, 2), date(2024, 1, 3)])
+    return pd.concat(
+        {ticker: pd.DataFrame({"Open": values, "Close": values}, index=index) for ticker, values in closes.items()},
+        axis=1, names=["Ticker", "Price"]
+    )
+
+def test_price_provider_is_abstract():
+    with pytest.raises(TypeError):
+        PriceProvider()
+
+def test_chunk_is_one_download_split_per_ticker(monkeypatch):
+    downloads = []
+    def download(tickers, **kwargs):
+        downloads.append((tickers, kwargs["threads"]))
+        return make_download({"AAA": [10.0, 11.0], "CCC": [float("nan"), 5.0]})
+
+    # BBB isn't in the download: fetched on its own, it fails once and then has no prices in the range
+    attempts = []
+    def fetch_ticker(ticker, start, end):
+        attempts.append(ticker)
+        if len(attempts) == 1:
+            raise RuntimeError("Too Many Requests")
+        return {}
+
+    monkeypatch.setattr(price_provider.yf, "download", download)
+    monkeypatch.setattr(price_provider, "backoff_delay", lambda attempt: 0)
+    provider = YFinanceProvider(workers=3, retries=1, rate=1000, burst=1000)
+    monkeypatch.setattr(provider, "fetch_ticker", fetch_ticker)
+
+    prices, failed = provider.get_prices_with_failures(["AAA", "BBB", "CCC"], date(2024, 1, 1), date(2024, 1, 5))
+
+    assert downloads == [(["AAA", "BBB", "CCC"], 3)]
+    assert attempts == ["BBB", "BBB"]
+    assert failed == []
+    assert prices == {
+        "AAA": {date(2024, 1, 2): 10.0, date(2024, 1, 3): 11.0},
+        "BBB": {},
+        "CCC": {date(2024, 1, 3): 5.0},
+    }
@@ -0,0 +1,50 @@
+from datetime import date
+
+import pandas as pd
+
+from backend.services.portfolio import get_finalized_watermarks
+from backend.services.price_cache import PriceCache, CachedPriceProvider
+from backend.services.price_provider import PriceProvider
+
+START_DATE = date(2024, 1, 1)
+SETTLED_THROUGH = date(2024, 1, 19)
+
+class StaticProvider(PriceProvider):
+    def __init__(self, prices):
+        self.prices = prices
+
+    def get_prices_with_failures(self, tickers, start, end):
+        return {
+            ticker: {day: price for day, price in self.prices.get(ticker, {}).items() if start <= day < end}
+            for ticker in tickers
+        }, []
+
+def finalize(prices, price_watermarks, tmp_path, fx_coverage=None, ticker_currency=None):
+    provider = CachedPriceProvider(StaticProvider(prices), PriceCache(str(tmp_path)), SETTLED_THROUGH)
+    prices_df = provider.get_price_frame(list(prices), START_DATE, date(2024, 1, 23))
+    prices_df["date"] = pd.to_datetime(prices_df["date"])
+    return get_finalized_watermarks(
+        list(prices), provider.cache, prices_df, price_watermarks, START_DATE, SETTLED_THROUGH,
+        ticker_currency or {}, fx_coverage or {}
+    )
+
+def test_ticker_without_newer_prices_moves_to_settled_day(tmp_path):
+    # Quoted until Jan 5, then delisted: the source answers the later days without prices
+    prices = {"OLD": {date(2024, 1, day): 10.0 for day in (2, 3, 4, 5)}}
+
+    # The first fetch ends at the last close, the next run asks for the days after it
+    assert finalize(prices, {}, tmp_path) == {"OLD": date(2024, 1, 5)}
+    # Answered without newer prices: the watermark moves on, so its rows aren't recalculated on every run
+    assert finalize(prices, {"OLD": date(2024, 1, 5)}, tmp_path) == {"OLD": SETTLED_THROUGH}
+
+def test_watermark_waits_for_a_lagging_source(tmp_path):
+    # The source only has closes through Jan 17, although Jan 18 and 19 are settled
+    prices = {"LAG": {date(2024, 1, day): 10.0 for day in range(2, 18)}}
+
+    assert finalize(prices, {}, tmp_path) == {"LAG": date(2024, 1, 17)}
+
+def test_foreign_ticker_needs_fx_coverage(tmp_path):
+    prices = {"USD": {date(2024, 1, day): 10.0 for day in range(2, 20)}}
+
+    assert finalize(prices, {}, tmp_path, {}, {"USD": "USD"}) == {}
+    assert finalize(prices, {}, tmp_path / "fx", {"USD-EUR": (START_DATE, date(2024, 1, 20))}, {"USD": "USD"}) == {"USD": SETTLED_THROUGH}